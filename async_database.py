@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+import metrics
+from scheduler import update_scheduler
+from config import LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL, LOG_BUFFER_LIMIT, LOG_OVERFLOW_POLICY, FSM_BUSY_TIMEOUT
+
+# Усі виклики sqlite3 виконуються в одному окремому потоці, який володіє постійним
+# з'єднанням (database.get_connection). Так очікування блокування (timeout=20) чи
+# повільний диск не зупиняють цикл подій aiogram, а записи не конкурують між собою.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+# Спільні стани FSM (storage.SQLiteStorage з shared=True) читаються на кожне оновлення,
+# тому мають власний потік і з'єднання з коротким очікуванням блокування: скидання
+# журналу, компакція чи чужий запис не затримують get_state. Потік створюється
+# лише при першому виклику
+_fsm_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="db-fsm",
+    initializer=database.set_busy_timeout, initargs=(FSM_BUSY_TIMEOUT,)
+)
+
+# Сумарний час роботи з базою; оновлюється потоками-воркерами
+db_stats = {"calls": 0, "seconds": 0.0}
+
+def _timed_call(func, args, kwargs):
+    started = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - started
+        db_stats["calls"] += 1
+        db_stats["seconds"] += elapsed
+        metrics.DB_QUERY_DURATION.observe(elapsed, func.__name__)
+
+async def run(func, *args, **kwargs):
+    """Виконує синхронну функцію бази даних у потоці-воркері"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _timed_call, func, args, kwargs)
+
+async def run_fsm(func, *args, **kwargs):
+    """Як run, але в окремому потоці для спільних станів FSM"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_fsm_executor, _timed_call, func, args, kwargs)
+
+# --- Буферизований журнал дій ---
+class AuditLogWriter:
+    """Накопичує дії користувачів у пам'яті та записує їх пачками однією транзакцією.
+
+    Скидання відбувається, коли в буфері набралося batch_size записів або минуло
+    flush_interval секунд. Буфер обмежений max_buffer записами: при переповненні
+    політика "drop" відкидає нові записи (лічильник dropped), а "block" змушує
+    виклик log() дочекатися запису в базу.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=2.0, max_buffer=10000, overflow="drop"):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.overflow = overflow
+        self.flushed = 0
+        self.dropped = 0
+        self._buffer = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def log(self, user_id, action, currency=None):
+        if len(self._buffer) >= self.max_buffer:
+            if self.overflow == "block":
+                await self.flush()
+            else:
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    logging.warning(f"Буфер журналу переповнено, відкинуто записів: {self.dropped}")
+                return
+        self._buffer.append((user_id, action, currency, database.utc_timestamp()))
+        # Під перевантаженням не скидаємо за розміром — запис відкладається до таймера
+        if len(self._buffer) >= self.batch_size and not update_scheduler.overloaded:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+            try:
+                await run(database.log_actions, batch)
+                self.flushed += len(batch)
+            except Exception as e:
+                logging.error(f"Database logging error: {e}")
+                # Повертаємо невдалу пачку в буфер, скільки дозволяє ліміт
+                lost = max(len(batch) + len(self._buffer) - self.max_buffer, 0)
+                self.dropped += lost
+                self._buffer[:0] = batch[lost:]
+
+    async def stop(self):
+        """Зупиняє фонове скидання та записує все, що залишилось у буфері"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+audit_log = AuditLogWriter(
+    batch_size=LOG_BATCH_SIZE,
+    flush_interval=LOG_FLUSH_INTERVAL,
+    max_buffer=LOG_BUFFER_LIMIT,
+    overflow=LOG_OVERFLOW_POLICY,
+)
+
+metrics.CallbackMetric("bot_audit_log_buffered", "Записів журналу в буфері", lambda: len(audit_log._buffer))
+metrics.CallbackMetric("bot_audit_log_flushed_total", "Записано в базу", lambda: audit_log.flushed, "counter")
+metrics.CallbackMetric("bot_audit_log_dropped_total", "Відкинуто через переповнення", lambda: audit_log.dropped, "counter")
+metrics.CallbackMetric("bot_rates_cache_hits_total", "Читання курсів з кешу", lambda: database.cache_stats["hits"], "counter")
+metrics.CallbackMetric("bot_rates_cache_misses_total", "Завантаження кешу курсів з бази", lambda: database.cache_stats["misses"], "counter")
+
+# --- Асинхронні аналоги функцій database.py ---
+
+async def init_db():
+    await run(database.init_db)
+
+# Слухачі змін курсів: async-функції, які отримують список змін від set_rate/set_rates
+rate_change_listeners = []
+
+async def _notify_rate_changes(changes):
+    for listener in rate_change_listeners:
+        try:
+            await listener(changes)
+        except Exception as e:
+            logging.error(f"Rate change listener error: {e}")
+
+async def set_rate(currency: str, buy: float, sell: float):
+    version, changes = await run(database.set_rate, currency, buy, sell)
+    if changes:
+        await _notify_rate_changes(changes)
+    return version, changes
+
+async def set_rates(rows):
+    version, changes = await run(database.set_rates, rows)
+    if changes:
+        await _notify_rate_changes(changes)
+    return version, changes
+
+async def toggle_subscription(user_id: int, currency: str) -> bool:
+    return await run(database.toggle_subscription, user_id, currency)
+
+async def get_rates_snapshot():
+    """(версія, {currency: (buy, sell)}) — курси разом із версією, до якої вони належать"""
+    # Свіжий кеш — це лише пошук у словнику, потік-воркер не потрібен
+    snapshot = database.get_fresh_rates()
+    if snapshot is None:
+        snapshot = await run(database.get_rates_snapshot)
+    return snapshot
+
+async def get_rate(currency: str):
+    _, rates = await get_rates_snapshot()
+    return rates.get(currency.upper())
+
+async def log_action(user_id, action, currency=None):
+    # Лише кладемо дію в буфер, запис у базу відбувається у фоні
+    await audit_log.log(user_id, action, currency)
+
+async def get_global_stats():
+    return await run(database.get_global_stats)
+
+async def get_stats_report(days: int = 7):
+    return await run(database.get_stats_report, days)
+
+async def close():
+    """Дописує буфер журналу, закриває з'єднання воркера та зупиняє потік"""
+    await audit_log.stop()
+    try:
+        await run(database.close_connection)
+        await run_fsm(database.close_connection)
+    except Exception as e:
+        logging.error(f"Database close error: {e}")
+    _executor.shutdown(wait=True)
+    _fsm_executor.shutdown(wait=True)
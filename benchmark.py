@@ -0,0 +1,213 @@
+"""Навантажувальний тест диспетчера без Telegram.
+
+Піднімає локальний фейковий Bot API, подає в `dp` синтетичні оновлення від багатьох
+користувачів (повний сценарій розрахунку: меню -> валюта -> розрахувати -> тип операції
+-> сума) і звітує про пропускну здатність, перцентилі затримки по хендлерах, час у базі
+та приріст пам'яті. Працює на тимчасовій копії бази, робочий currency.db не чіпає.
+
+    python benchmark.py --users 200 --flows 5 --api-latency 20
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+# Ліміти антиспаму піднімаємо до імпорту config, щоб симульовані користувачі не впиралися в них
+os.environ.setdefault("RATE_LIMIT_RATE", "1000000")
+os.environ.setdefault("RATE_LIMIT_BURST", "1000000")
+os.environ.setdefault("API_TOKEN", "123456:BENCHMARK")
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Update
+
+import async_database
+import database
+import main
+from bot import dp
+
+RATES = {"USD": (41.2, 41.8), "EUR": (44.5, 45.3), "PLN": (10.3, 10.6), "GBP": (52.0, 53.1)}
+
+
+# --- Фейковий Bot API ---
+async def start_fake_api(latency: float):
+    message_ids = itertools.count(1)
+
+    async def handle(request):
+        if latency:
+            await asyncio.sleep(latency)
+        method = request.match_info["method"].lower()
+        form = await request.post()
+        if method in ("sendmessage", "editmessagetext"):
+            result = {
+                "message_id": next(message_ids),
+                "date": int(time.time()),
+                "chat": {"id": int(form.get("chat_id", 0)), "type": "private"},
+                "text": form.get("text", ""),
+            }
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+# --- Синтетичні оновлення ---
+update_ids = itertools.count(1)
+
+def _user(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+def message_update(user_id, text):
+    return Update.model_validate({
+        "update_id": next(update_ids),
+        "message": {
+            "message_id": next(update_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": _user(user_id),
+            "text": text,
+        },
+    })
+
+def callback_update(user_id, data):
+    return Update.model_validate({
+        "update_id": next(update_ids),
+        "callback_query": {
+            "id": str(next(update_ids)),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": "...",
+            },
+        },
+    })
+
+def conversion_flow(user_id, n):
+    currency = list(RATES)[n % len(RATES)]
+    op_type = "buy" if n % 2 == 0 else "sell"
+    return [
+        message_update(user_id, "💱 Курс валют"),
+        callback_update(user_id, f"currency_{currency}"),
+        callback_update(user_id, "confirm_calc"),
+        callback_update(user_id, f"op_{op_type}"),
+        message_update(user_id, str(100 + n)),
+    ]
+
+
+# --- Вимірювання ---
+class TimingMiddleware(BaseMiddleware):
+    """Час виконання кожного хендлера (внутрішній middleware бачить обраний хендлер)"""
+
+    def __init__(self, samples):
+        self.samples = samples
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.samples[data["handler"].callback.__name__].append(time.perf_counter() - started)
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+def print_report(samples, updates, elapsed, db_seconds, db_calls, memory_growth, max_rss_kb):
+    print(f"\nОновлень: {updates} за {elapsed:.2f} с — {updates / elapsed:.0f} оновлень/с")
+    print(f"База: {db_calls} викликів, {db_seconds * 1000:.0f} мс сумарно")
+    growth = f"приріст {memory_growth / 1024:.0f} КБ (tracemalloc), " if memory_growth is not None else ""
+    print(f"Пам'ять: {growth}пік RSS {max_rss_kb / 1024:.1f} МБ\n")
+    print(f"{'хендлер':<24}{'к-сть':>8}{'p50 мс':>10}{'p90 мс':>10}{'p99 мс':>10}{'max мс':>10}")
+    for name, values in sorted(samples.items()):
+        print(
+            f"{name:<24}{len(values):>8}"
+            + "".join(f"{percentile(values, q) * 1000:>10.2f}" for q in (0.5, 0.9, 0.99))
+            + f"{max(values) * 1000:>10.2f}"
+        )
+
+
+async def run_benchmark(users, flows, api_latency, trace_memory):
+    tmpdir = tempfile.mkdtemp(prefix="bench_")
+    database.DB_PATH = os.path.join(tmpdir, "bench.db")
+    await async_database.init_db()
+    for currency, (buy, sell) in RATES.items():
+        await async_database.set_rate(currency, buy, sell)
+    async_database.audit_log.start()
+
+    main.setup_dispatcher()
+    samples = defaultdict(list)
+    timing = TimingMiddleware(samples)
+    dp.message.middleware(timing)
+    dp.callback_query.middleware(timing)
+
+    api_runner, api_url = await start_fake_api(api_latency / 1000)
+    bot = Bot(token=os.environ["API_TOKEN"], session=AiohttpSession(api=TelegramAPIServer.from_base(api_url)))
+
+    async def simulate_user(user_id):
+        for n in range(flows):
+            for update in conversion_flow(user_id, n):
+                started = time.perf_counter()
+                await dp.feed_update(bot, update)
+                samples["update (end-to-end)"].append(time.perf_counter() - started)
+
+    # Прогрів: кеш курсів, з'єднання, імпорти
+    await simulate_user(10**9)
+    samples.clear()
+    db_calls, db_seconds = async_database.db_stats["calls"], async_database.db_stats["seconds"]
+
+    # tracemalloc помітно сповільнює інтерпретатор, тому вмикається окремим прапорцем
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(simulate_user(user_id) for user_id in range(1, users + 1)))
+    elapsed = time.perf_counter() - started
+    memory_growth = tracemalloc.get_traced_memory()[0] if trace_memory else None
+    tracemalloc.stop()
+
+    print_report(
+        samples,
+        users * flows * 5,
+        elapsed,
+        async_database.db_stats["seconds"] - db_seconds,
+        async_database.db_stats["calls"] - db_calls,
+        memory_growth,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    )
+
+    await dp.storage.close()
+    await async_database.close()
+    await bot.session.close()
+    await api_runner.cleanup()
+    shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Навантажувальний тест диспетчера бота")
+    parser.add_argument("--users", type=int, default=100, help="кількість симульованих користувачів")
+    parser.add_argument("--flows", type=int, default=5, help="сценаріїв розрахунку на користувача")
+    parser.add_argument("--api-latency", type=float, default=0, help="затримка фейкового Bot API, мс")
+    parser.add_argument("--trace-memory", action="store_true", help="рахувати приріст пам'яті через tracemalloc")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(run_benchmark(args.users, args.flows, args.api_latency, args.trace_memory))
@@ -1,5 +1,14 @@
 from aiogram import Bot, Dispatcher
-from config import API_TOKEN
+from config import API_TOKEN, FSM_TTL, ADMIN_SESSION_TTL, FSM_SHARED
+from storage import SQLiteStorage
+from handlers import BotStates
 
 bot = Bot(token=API_TOKEN)
-dp = Dispatcher()
\ No newline at end of file
+# Стани FSM зберігаються в SQLite, тож переживають перезапуск; спільними для кількох
+# процесів вони стають лише з FSM_SHARED
+storage = SQLiteStorage(
+    default_ttl=FSM_TTL,
+    state_ttl={BotStates.admin_active.state: ADMIN_SESSION_TTL},
+    shared=FSM_SHARED,
+)
+dp = Dispatcher(storage=storage)
\ No newline at end of file
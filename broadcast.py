@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+import async_database
+import database
+import metrics
+
+BROADCAST_MESSAGES = metrics.Counter(
+    "bot_broadcast_messages_total", "Повідомлення розсилок за результатом", ("result",)
+)
+
+
+class TokenBucket:
+    """Не більше rate подій на секунду з допустимим сплеском capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def pause(self, seconds: float):
+        """Telegram повернув 429 — до кінця retry_after не надсилаємо нічого"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def render_change(currency: str, old, new) -> str:
+    buy, sell = new
+    if old is None:
+        return f"🔔 Новий курс {currency}:\nКупівля: {buy:.2f} UAH\nПродаж: {sell:.2f} UAH"
+    return (
+        f"🔔 Курс {currency} змінився:\n"
+        f"Купівля: {old[0]:.2f} → {buy:.2f} UAH\n"
+        f"Продаж: {old[1]:.2f} → {sell:.2f} UAH"
+    )
+
+
+class Broadcaster:
+    """Розсилає підписникам сповіщення про зміну курсу в межах лімітів Telegram.
+
+    Глобальний token bucket тримає загальну швидкість (~30 повідомлень/с), а для кожного
+    чату витримується per_chat_interval між повідомленнями. На 429 уся розсилка
+    ставиться на паузу на retry_after. Прогрес (останній оброблений user_id) зберігається
+    в таблиці broadcasts після кожної сторінки підписників, тож після перезапуску
+    розсилка продовжується з того ж місця. Розсилки беруться в оренду по одній, і веде
+    її лише той процес, що тримає оренду: якщо збереження прогресу показує, що оренду
+    перехопили, розсилка зупиняється.
+    """
+
+    def __init__(self, bot: Bot, rate: float = 25, per_chat_interval: float = 1.0,
+                 concurrency: int = 10, page_size: int = 50, lease: float = 60):
+        self.bot = bot
+        self.bucket = TokenBucket(rate, capacity=rate)
+        self.per_chat_interval = per_chat_interval
+        self.page_size = page_size
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._last_sent = {}  # chat_id -> monotonic час останнього повідомлення
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def notify_changes(self, changes):
+        """Слухач async_database: ставить у чергу розсилку для кожного зміненого курсу"""
+        for currency, old, new in changes:
+            await async_database.run(database.create_broadcast, currency, render_change(currency, old, new))
+        if changes:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                while True:
+                    broadcast = await async_database.run(
+                        database.claim_broadcast, self.owner, time.time(), self.lease
+                    )
+                    if broadcast is None:
+                        break
+                    await self._deliver(*broadcast)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Помилка розсилки: {e}")
+            # Перевіряємо й без сигналу — щоб підхопити розсилки інстансу, що впав
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.lease)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _deliver(self, broadcast_id, currency, text, last_user_id, sent, failed):
+        started = time.monotonic()
+        delivered_before = sent + failed
+        while True:
+            user_ids = await async_database.run(
+                database.get_subscribers_page, currency, last_user_id, self.page_size
+            )
+            if not user_ids:
+                break
+            results = await asyncio.gather(*(self._send(user_id, text) for user_id in user_ids))
+            sent += sum(results)
+            failed += len(results) - sum(results)
+            last_user_id = user_ids[-1]
+            if not await async_database.run(
+                database.save_broadcast_progress, broadcast_id, self.owner, last_user_id, sent, failed,
+                time.time() + self.lease
+            ):
+                logging.warning(f"Розсилку #{broadcast_id} ({currency}) перехопив інший процес, зупиняємо")
+                return
+        if not await async_database.run(
+            database.save_broadcast_progress, broadcast_id, self.owner, last_user_id, sent, failed, None, True
+        ):
+            logging.warning(f"Розсилку #{broadcast_id} ({currency}) перехопив інший процес")
+            return
+        elapsed = time.monotonic() - started
+        processed = sent + failed - delivered_before
+        logging.info(
+            f"Розсилка #{broadcast_id} ({currency}) завершена: надіслано {sent}, помилок {failed}, "
+            f"{processed / elapsed if elapsed else 0:.1f} повідомлень/с"
+        )
+        self._prune_last_sent()
+
+    async def _send(self, chat_id: int, text: str) -> bool:
+        async with self._semaphore:
+            for attempt in range(3):
+                # Не частіше за per_chat_interval в один чат
+                wait = self._last_sent.get(chat_id, 0) + self.per_chat_interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await self.bucket.acquire()
+                self._last_sent[chat_id] = time.monotonic()
+                try:
+                    await self.bot.send_message(chat_id, text)
+                    BROADCAST_MESSAGES.inc("sent")
+                    return True
+                except TelegramRetryAfter as e:
+                    BROADCAST_MESSAGES.inc("retry_after")
+                    self.bucket.pause(e.retry_after)
+                except TelegramForbiddenError:
+                    # Користувач заблокував бота — більше не надсилаємо
+                    await async_database.run(database.remove_subscriber, chat_id)
+                    break
+                except TelegramBadRequest as e:
+                    logging.warning(f"Розсилка: не вдалося надіслати {chat_id}: {e}")
+                    break
+                except Exception as e:
+                    logging.warning(f"Розсилка: помилка мережі для {chat_id}: {e}")
+                    await asyncio.sleep(2 ** attempt)
+            BROADCAST_MESSAGES.inc("failed")
+            return False
+
+    def _prune_last_sent(self):
+        threshold = time.monotonic() - self.per_chat_interval
+        self._last_sent = {chat_id: t for chat_id, t in self._last_sent.items() if t > threshold}
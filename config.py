@@ -5,4 +5,56 @@ load_dotenv()
 
 API_TOKEN = os.getenv("API_TOKEN")
 # Якщо в .env немає пароля, буде використано стандартний (але краще додати в .env)
-ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
\ No newline at end of file
+ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
+
+# Буферизований запис журналу дій (log_action)
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", 200))          # скидати, коли набралося стільки записів
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", 2))  # або щонайменше раз на N секунд
+LOG_BUFFER_LIMIT = int(os.getenv("LOG_BUFFER_LIMIT", 10000))    # максимум записів у пам'яті
+# Що робити з переповненим буфером: "drop" — відкидати нові записи, "block" — чекати запису в базу
+LOG_OVERFLOW_POLICY = os.getenv("LOG_OVERFLOW_POLICY", "drop")
+
+# Режим вебхука: якщо WEBHOOK_URL задано (напр. https://my-bot.onrender.com), оновлення
+# приймає веб-сервер з main.py, інакше бот працює через polling. У режимі вебхука
+# WEBHOOK_SECRET обов'язковий — без нього бот не запуститься
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
+# Антиспам (token bucket): BURST подій поспіль, далі RATE подій на секунду.
+# Відра користувачів, неактивних довше за TTL секунд, видаляються
+RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", 0.8))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 3))
+RATE_LIMIT_TTL = float(os.getenv("RATE_LIMIT_TTL", 600))
+
+# Термін дії станів FSM у секундах: сесія адміна та решта станів (розрахунок суми)
+ADMIN_SESSION_TTL = float(os.getenv("ADMIN_SESSION_TTL", 600))
+FSM_TTL = float(os.getenv("FSM_TTL", 86400))
+# Спільні стани FSM для кількох інстансів: кожна зміна одразу пишеться в базу, а кожне
+# читання йде в базу — тобто запит до бази на кожне звернення до стану в кожному оновленні.
+# Без цього стани кешуються в пам'яті процесу й скидаються пачками, тож інший інстанс
+# бачить їх із запізненням до ~6 с — годиться лише для одного інстансу.
+# За замовчуванням увімкнено в режимі вебхука (там бот може працювати за балансувальником)
+FSM_SHARED = os.getenv("FSM_SHARED", "1" if WEBHOOK_URL else "0") == "1"
+# У спільному режимі FSM має власне з'єднання й потік; стільки секунд запис стану чекає,
+# поки інший інстанс тримає блокування, після чого зміна відкладається до фонового скидання
+FSM_BUSY_TIMEOUT = float(os.getenv("FSM_BUSY_TIMEOUT", 2))
+
+# Зберігання логів: сирі рядки старші за LOG_RETENTION_DAYS згортаються в денні агрегати
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", 30))
+LOG_COMPACTION_INTERVAL = float(os.getenv("LOG_COMPACTION_INTERVAL", 3600))
+LOG_COMPACTION_CHUNK = int(os.getenv("LOG_COMPACTION_CHUNK", 1000))
+
+# Автоматичне оновлення курсів: HTTP(S)-адреса або шлях до JSON-файлу (порожньо — вимкнено)
+RATES_FEED_URL = os.getenv("RATES_FEED_URL")
+RATES_FEED_INTERVAL = float(os.getenv("RATES_FEED_INTERVAL", 3600))
+
+# Скільки секунд Telegram може кешувати відповіді inline-режиму
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", 60))
+
+# Обробка оновлень: скільки користувачів обслуговуються паралельно та максимальна черга,
+# після якої нові оновлення відкидаються
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", 64))
+UPDATE_QUEUE_LIMIT = int(os.getenv("UPDATE_QUEUE_LIMIT", 1000))
+# Скільки оновлень одного користувача може чекати своєї черги, решта відкидається
+UPDATE_USER_QUEUE_LIMIT = int(os.getenv("UPDATE_USER_QUEUE_LIMIT", 5))
\ No newline at end of file
@@ -0,0 +1,83 @@
+import math
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from itertools import product
+
+BASE_CURRENCY = "UAH"
+CENT = Decimal("0.01")
+# Код валюти: 2-10 латинських літер, щоб callback_data кнопок не перевищувала 64 байти
+CURRENCY_CODE = re.compile(r"^[A-Z]{2,10}$")
+# Сума звичайним записом: до 9 цифр і до 2 знаків після крапки чи коми (без "1e30", "nan")
+AMOUNT_PATTERN = r"\d{1,9}(?:[.,]\d{1,2})?"
+
+# Матриця крос-курсів для поточної версії курсів
+_matrix = {}
+_matrix_version = None
+
+
+def validate_rate(currency: str, buy: float, sell: float):
+    """Повертає опис помилки або None, якщо курс можна записати в таблицю rates"""
+    if not CURRENCY_CODE.match(currency):
+        return f"некоректний код валюти {currency}"
+    if not (math.isfinite(buy) and math.isfinite(sell) and buy > 0 and sell > 0):
+        return "курс має бути більшим за нуль"
+    if buy > sell:
+        return f"купівля {currency} більша за продаж"
+    return None
+
+
+def build_cross_rates(rates: dict) -> dict:
+    """Матриця {(from, to): коефіцієнт} для всіх пар валют, включно з UAH.
+
+    Клієнт віддає валюту `from` (обмінник купує її за buy) і отримує `to`
+    (обмінник продає її за sell), тож коефіцієнт = buy[from] / sell[to].
+    Обчислення в Decimal без проміжного округлення.
+    """
+    buy = {BASE_CURRENCY: Decimal(1)}
+    sell = {BASE_CURRENCY: Decimal(1)}
+    for currency, (rate_buy, rate_sell) in rates.items():
+        if rate_buy and rate_sell:
+            buy[currency] = Decimal(str(rate_buy))
+            sell[currency] = Decimal(str(rate_sell))
+    return {(src, dst): buy[src] / sell[dst] for src, dst in product(buy, sell) if src != dst}
+
+
+def get_cross_rates(snapshot) -> dict:
+    """Матриця для знімка (версія, курси); перебудовується лише після зміни курсів"""
+    global _matrix, _matrix_version
+    version, rates = snapshot
+    if version != _matrix_version:
+        _matrix = build_cross_rates(rates)
+        _matrix_version = version
+    return _matrix
+
+
+def parse_amount(text: str):
+    text = text.strip()
+    if not re.fullmatch(AMOUNT_PATTERN, text):
+        return None
+    amount = Decimal(text.replace(",", "."))
+    return amount if amount > 0 else None
+
+
+def apply_rate(amount: Decimal, rate):
+    """amount * rate, округлене до копійок (ROUND_HALF_UP) — єдине правило для всіх розрахунків.
+
+    Курс із таблиці (float) переводиться в Decimal через str, щоб 41.25 не стало 41.249999...
+    Повертає None, якщо результат не вміщується в точність Decimal.
+    """
+    if not isinstance(rate, Decimal):
+        rate = Decimal(str(rate))
+    try:
+        return (amount * rate).quantize(CENT, rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        return None
+
+
+def convert(matrix: dict, amount: Decimal, src: str, dst: str):
+    """Повертає (сума в dst, округлена до копійок, коефіцієнт) або None, якщо пари немає чи сума завелика"""
+    rate = matrix.get((src.upper(), dst.upper()))
+    if rate is None:
+        return None
+    result = apply_rate(amount, rate)
+    return (result, rate) if result is not None else None
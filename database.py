@@ -1,96 +1,611 @@
 import sqlite3
 import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
 
 DB_PATH = "currency.db"
 
+# --- Кеш курсів у пам'яті ---
+# Таблиця rates змінюється кілька разів на день, тому читаємо її цілком один раз,
+# а далі get_rate обслуговується зі словника. Знімок — це кортеж (версія, словник),
+# який ніколи не змінюється на місці: set_rate підміняє його новим, тож читачі завжди
+# бачать курси разом із версією, до якої вони належать (ключ для похідних кешів —
+# клавіатур, крос-курсів, inline-відповідей).
+# Версія — лічильник у таблиці rates_version, який set_rates підвищує в тій самій
+# транзакції, тож вона однакова для всіх процесів (інстансів за балансувальником).
+# Не частіше ніж раз на RATES_CHECK_INTERVAL секунд кеш звіряє її одним запитом
+# і перечитує курси, лише якщо їх змінив інший процес.
+RATES_CHECK_INTERVAL = 2.0
+_rates_lock = threading.Lock()
+_rates_snapshot = None  # (версія, {currency: (buy, sell)}) або None, якщо ще не завантажено
+_rates_checked_at = 0.0  # monotonic-час останньої звірки з базою
+cache_stats = {"hits": 0, "misses": 0}
+
+_local = threading.local()
+
 def get_connection():
+    # Одне постійне з'єднання на потік: воркер бази (async_database) перевикористовує
+    # його замість відкриття файлу на кожен запит.
     # timeout=20 дозволяє чекати, якщо база зайнята іншим запитом
-    return sqlite3.connect(DB_PATH, timeout=20)
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=getattr(_local, "busy_timeout", 20))
+        # WAL: читачі не блокують запис і навпаки; synchronous=NORMAL безпечний з WAL
+        # і не робить fsync на кожен коміт
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA cache_size = -8000")  # ~8 МБ кешу сторінок
+        conn.execute("PRAGMA temp_store = MEMORY")
+        _local.conn = conn
+    return conn
 
-def init_db():
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        
-        # Створюємо таблицю з двома колонками для курсу: buy та sell
+def set_busy_timeout(seconds: float):
+    """Скільки з'єднання поточного потоку чекає на блокування (викликати до першого запиту)"""
+    _local.busy_timeout = seconds
+
+def close_connection():
+    """Закриває з'єднання поточного потоку"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+def utc_timestamp() -> str:
+    """Час у форматі CURRENT_TIMESTAMP з SQLite (UTC)"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+# --- Міграції схеми ---
+# Кожен крок виконується рівно один раз у власній транзакції; номер останнього
+# застосованого кроку зберігається в PRAGMA user_version. Нові зміни схеми —
+# лише новими кроками в кінці списку MIGRATIONS.
+
+def _migration_base(cursor):
+    # Створюємо таблицю з двома колонками для курсу: buy та sell
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rates (
+            currency TEXT PRIMARY KEY,
+            buy REAL,
+            sell REAL
+        )
+    """)
+
+    # Таблиця користувачів
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            requests INTEGER DEFAULT 0
+        )
+    """)
+
+    # Таблиця логів
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            action TEXT,
+            currency TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # База зі старою структурою (одна колонка 'rate') — переносимо курс в обидві колонки
+    cursor.execute("PRAGMA table_info(rates)")
+    columns = [column[1] for column in cursor.fetchall()]
+    if "rate" in columns:
+        cursor.execute("ALTER TABLE rates RENAME TO rates_old")
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS rates (
+            CREATE TABLE rates (
                 currency TEXT PRIMARY KEY,
                 buy REAL,
                 sell REAL
             )
         """)
-        
-        # Таблиця користувачів
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                requests INTEGER DEFAULT 0
-            )
-        """)
-        
-        # Таблиця логів
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                action TEXT,
-                currency TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Перевірка на випадок, якщо база вже існувала зі старою структурою
-        # Додаємо колонки, якщо їх немає (міграція)
-        cursor.execute("PRAGMA table_info(rates)")
-        columns = [column[1] for column in cursor.fetchall()]
-        if "rate" in columns:
-            # Якщо стара колонка 'rate' існує, видаляємо стару таблицю або перейменовуємо
-            # Найпростіший шлях для локальної розробки — перестворити
-            cursor.execute("DROP TABLE rates")
-            cursor.execute("""
-                CREATE TABLE rates (
-                    currency TEXT PRIMARY KEY,
-                    buy REAL,
-                    sell REAL
-                )
-            """)
-            
-        conn.commit()
+        cursor.execute("INSERT INTO rates (currency, buy, sell) SELECT currency, rate, rate FROM rates_old")
+        cursor.execute("DROP TABLE rates_old")
+
+def _migration_stats_counters(cursor):
+    # Лічильники статистики, які оновлюються разом із записом логів
+    # Ключі: users, actions, action:<дія>, currency:<валюта>, day:<YYYY-MM-DD>, hour:<YYYY-MM-DD HH>
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("SELECT 1 FROM stats_counters WHERE key = 'actions'")
+    if cursor.fetchone() is None:
+        _backfill_stats(cursor)
+
+def _migration_fsm_storage(cursor):
+    # Стани FSM (storage.SQLiteStorage)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            expires_at REAL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_fsm_storage_expires ON fsm_storage (expires_at)")
+
+def _migration_logs_rollup(cursor):
+    # Денні агрегати логів, старіших за вікно зберігання (maintenance.compact_logs)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS logs_daily (
+            day TEXT NOT NULL,
+            action TEXT NOT NULL,
+            currency TEXT NOT NULL DEFAULT '',
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, action, currency)
+        )
+    """)
+
+def _migration_rate_history(cursor):
+    # Історія змін курсів (кожен set_rate додає рядок)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rate_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            currency TEXT NOT NULL,
+            buy REAL,
+            sell REAL,
+            changed_at DATETIME NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rate_history_currency ON rate_history (currency, changed_at)")
+    cursor.execute("SELECT 1 FROM rate_history LIMIT 1")
+    if cursor.fetchone() is None:
+        # Поточні курси — відправна точка історії
+        cursor.execute(
+            "INSERT INTO rate_history (currency, buy, sell, changed_at) SELECT currency, buy, sell, ? FROM rates",
+            (utc_timestamp(),)
+        )
+
+def _migration_subscriptions(cursor):
+    # Підписки на зміни курсу та розсилки (broadcast.Broadcaster)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            user_id INTEGER NOT NULL,
+            currency TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, currency)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_currency ON subscriptions (currency, user_id)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            currency TEXT NOT NULL,
+            text TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            last_user_id INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            owner TEXT,
+            lease_until REAL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            finished_at DATETIME
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts (status)")
+
+def _migration_logs_indexes(cursor):
+    # Пошук і компакція логів за часом та за користувачем
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_user_id ON logs (user_id)")
+
+def _migration_rates_version(cursor):
+    # Лічильник змін курсів, за яким процеси помічають чужі оновлення
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rates_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO rates_version (id, version) VALUES (1, 0)")
+
+MIGRATIONS = [
+    _migration_base,
+    _migration_stats_counters,
+    _migration_fsm_storage,
+    _migration_logs_rollup,
+    _migration_rate_history,
+    _migration_subscriptions,
+    _migration_logs_indexes,
+    _migration_rates_version,
+]
+
+def init_db():
+    """Застосовує лише ті міграції, яких ще немає в базі"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
+    if version >= len(MIGRATIONS):
+        return
+
+    if version == 0:
+        # Для нової бази режим діє одразу; для існуючої його закріпить VACUUM нижче
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+        cursor.execute("BEGIN")
+        try:
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logging.info(f"Міграцію бази {number} ({migration.__name__}) застосовано")
+
+    # Інкрементальний vacuum, щоб компакція логів повертала місце на диску.
+    # Для вже існуючої бази режим вмикається лише через повний VACUUM (одноразово)
+    cursor.execute("PRAGMA auto_vacuum")
+    if cursor.fetchone()[0] != 2:
+        cursor.execute("VACUUM")
+
+def _read_db_version(cursor) -> int:
+    cursor.execute("SELECT version FROM rates_version WHERE id = 1")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def _load_rates(cursor):
+    """Зчитує всю таблицю rates у кеш (викликати під _rates_lock)"""
+    global _rates_snapshot, _rates_checked_at
+    # Версію читаємо першою: якщо курси змінять між запитами, знімок буде новішим
+    # за свою версію, і наступна звірка просто перечитає його ще раз
+    db_version = _read_db_version(cursor)
+    cursor.execute("SELECT currency, buy, sell FROM rates")
+    _rates_snapshot = (db_version, {currency: (buy, sell) for currency, buy, sell in cursor.fetchall()})
+    _rates_checked_at = time.monotonic()
+    cache_stats["misses"] += 1
+    return _rates_snapshot
+
+def _refresh_rates(cursor):
+    """Звіряє кеш з базою (викликати під _rates_lock); перечитує курси, лише якщо версія інша"""
+    global _rates_checked_at
+    if _rates_snapshot is None or _read_db_version(cursor) != _rates_snapshot[0]:
+        return _load_rates(cursor)
+    _rates_checked_at = time.monotonic()
+    return _rates_snapshot
+
+def get_fresh_rates():
+    """Знімок (версія, курси), якщо його нещодавно звіряли з базою, інакше None (без звернення до бази)"""
+    snapshot = _rates_snapshot
+    if snapshot is not None and time.monotonic() - _rates_checked_at < RATES_CHECK_INTERVAL:
+        cache_stats["hits"] += 1
+        return snapshot
+    return None
+
+def get_rates_snapshot():
+    """Повертає знімок (версія, {currency: (buy, sell)}), за потреби звіривши його з базою"""
+    snapshot = get_fresh_rates()
+    if snapshot is not None:
+        return snapshot
+    with _rates_lock:
+        return _refresh_rates(get_connection().cursor())
+
+def _backfill_stats(cursor):
+    """Одноразово рахує лічильники з уже наявних логів"""
+    cursor.execute("""
+        INSERT OR REPLACE INTO stats_counters (key, value)
+        SELECT 'users', COUNT(*) FROM users
+        UNION ALL SELECT 'actions', COUNT(*) FROM logs
+        UNION ALL SELECT 'action:' || action, COUNT(*) FROM logs WHERE action IS NOT NULL GROUP BY action
+        UNION ALL SELECT 'currency:' || currency, COUNT(*) FROM logs WHERE currency IS NOT NULL GROUP BY currency
+        UNION ALL SELECT 'day:' || substr(timestamp, 1, 10), COUNT(*) FROM logs GROUP BY substr(timestamp, 1, 10)
+        UNION ALL SELECT 'hour:' || substr(timestamp, 1, 13), COUNT(*) FROM logs GROUP BY substr(timestamp, 1, 13)
+    """)
 
 def set_rate(currency: str, buy: float, sell: float):
     """Оновлює або додає курс купівлі та продажу"""
-    with get_connection() as conn:
+    return set_rates([(currency, buy, sell)])
+
+def set_rates(rows):
+    """Оновлює кілька курсів [(currency, buy, sell), ...] однією транзакцією.
+
+    Записуються лише рядки, що відрізняються від поточних, а версія курсів
+    підвищується один раз на весь набір. Повертає (version, changes): записану
+    версію з rates_version і список змін
+    [(currency, (old_buy, old_sell) або None, (buy, sell)), ...].
+    """
+    global _rates_snapshot, _rates_checked_at
+    rows = [(currency.upper(), buy, sell) for currency, buy, sell in rows]
+    with _rates_lock:
+        conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute("""
-            INSERT OR REPLACE INTO rates (currency, buy, sell) 
-            VALUES (?, ?, ?)
-        """, (currency.upper(), buy, sell))
-        conn.commit()
+        # Блокуємо запис одразу: зміни рахуються від актуальних курсів, навіть якщо
+        # їх щойно оновив інший процес
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            version, current = _refresh_rates(cursor)
+            changes = [
+                (currency, current.get(currency), (buy, sell))
+                for currency, buy, sell in rows
+                if current.get(currency) != (buy, sell)
+            ]
+            if not changes:
+                conn.rollback()
+                return version, changes
+            cursor.executemany("""
+                INSERT OR REPLACE INTO rates (currency, buy, sell) 
+                VALUES (?, ?, ?)
+            """, [(currency, buy, sell) for currency, _, (buy, sell) in changes])
+            changed_at = utc_timestamp()
+            cursor.executemany(
+                "INSERT INTO rate_history (currency, buy, sell, changed_at) VALUES (?, ?, ?, ?)",
+                [(currency, buy, sell, changed_at) for currency, _, (buy, sell) in changes]
+            )
+            cursor.execute("UPDATE rates_version SET version = version + 1 WHERE id = 1")
+            version = _read_db_version(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        # Запис пройшов — підміняємо знімок кешу новою копією
+        cache = dict(current)
+        cache.update((currency, new) for currency, _, new in changes)
+        _rates_snapshot = (version, cache)
+        _rates_checked_at = time.monotonic()
+    return version, changes
 
 def get_rate(currency: str):
     """Повертає кортеж (buy, sell) або None"""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT buy, sell FROM rates WHERE currency = ?", (currency.upper(),))
-        result = cursor.fetchone()
-        return result if result else None
+    return get_rates_snapshot()[1].get(currency.upper())
 
 def log_action(user_id, action, currency=None):
     try:
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO logs (user_id, action, currency) VALUES (?, ?, ?)", (user_id, action, currency))
-            cursor.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
-            cursor.execute("UPDATE users SET requests = requests + 1 WHERE user_id = ?", (user_id,))
-            conn.commit()
+        log_actions([(user_id, action, currency, utc_timestamp())])
     except Exception as e:
         logging.error(f"Database logging error: {e}")
 
+def log_actions(entries):
+    """Записує пачку дій [(user_id, action, currency, timestamp), ...] однією транзакцією"""
+    if not entries:
+        return
+    requests_per_user = Counter(entry[0] for entry in entries)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany("INSERT INTO logs (user_id, action, currency, timestamp) VALUES (?, ?, ?, ?)", entries)
+        cursor.executemany("INSERT OR IGNORE INTO users (user_id) VALUES (?)", [(u,) for u in requests_per_user])
+        new_users = cursor.rowcount
+        cursor.executemany(
+            "UPDATE users SET requests = requests + ? WHERE user_id = ?",
+            [(n, u) for u, n in requests_per_user.items()]
+        )
+        # Лічильники статистики оновлюються в тій же транзакції
+        counters = Counter({"actions": len(entries), "users": new_users})
+        for _, action, currency, timestamp in entries:
+            counters[f"action:{action}"] += 1
+            if currency:
+                counters[f"currency:{currency}"] += 1
+            counters[f"day:{timestamp[:10]}"] += 1
+            counters[f"hour:{timestamp[:13]}"] += 1
+        cursor.executemany("""
+            INSERT INTO stats_counters (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = value + excluded.value
+        """, [(k, v) for k, v in counters.items() if v])
+        conn.commit()
+
+def _get_counters(cursor, keys):
+    placeholders = ", ".join("?" * len(keys))
+    cursor.execute(f"SELECT key, value FROM stats_counters WHERE key IN ({placeholders})", keys)
+    values = dict(cursor.fetchall())
+    return [values.get(k, 0) for k in keys]
+
+def _get_counters_by_prefix(cursor, prefix):
+    # Діапазон по первинному ключу замість сканування: 'action:' <= key < 'action;'
+    cursor.execute(
+        "SELECT key, value FROM stats_counters WHERE key >= ? AND key < ? ORDER BY value DESC",
+        (prefix + ":", prefix + ";")
+    )
+    return [(key[len(prefix) + 1:], value) for key, value in cursor.fetchall()]
+
+def get_rate_history(currency: str, since: datetime, bucket_seconds: int):
+    """Історія курсу з since, проріджена до одного значення (останнього) на кошик.
+
+    Повертає (opening, buckets): курс, що діяв на момент since (або None), та
+    [(номер кошика, buy, sell), ...]. Читається лише діапазон індексу (currency, changed_at).
+    """
+    currency = currency.upper()
+    since_str = since.strftime("%Y-%m-%d %H:%M:%S")
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT buy, sell FROM rate_history
+            WHERE currency = ? AND changed_at < ?
+            ORDER BY changed_at DESC, id DESC LIMIT 1
+        """, (currency, since_str))
+        opening = cursor.fetchone()
+        # Для MAX(id) SQLite бере buy/sell з того ж рядка — останнє значення в кошику
+        cursor.execute("""
+            SELECT (CAST(strftime('%s', changed_at) AS INTEGER) - ?) / ? AS bucket, buy, sell, MAX(id)
+            FROM rate_history
+            WHERE currency = ? AND changed_at >= ?
+            GROUP BY bucket ORDER BY bucket
+        """, (int(since.timestamp()), bucket_seconds, currency, since_str))
+        return opening, [(bucket, buy, sell) for bucket, buy, sell, _ in cursor.fetchall()]
+
+# --- Обслуговування таблиці логів ---
+
+def compact_logs_chunk(cutoff: str, chunk_size: int) -> int:
+    """Згортає до chunk_size найстаріших логів, старіших за cutoff, у logs_daily та видаляє їх.
+
+    Кожна порція — окрема коротка транзакція, тож база не блокується надовго.
+    Повертає кількість оброблених рядків.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT MIN(id), MAX(id) FROM (SELECT id FROM logs WHERE timestamp < ? ORDER BY id LIMIT ?)",
+            (cutoff, chunk_size)
+        )
+        first_id, last_id = cursor.fetchone()
+        if first_id is None:
+            return 0
+        chunk = (first_id, last_id, cutoff)
+        cursor.execute("""
+            INSERT INTO logs_daily (day, action, currency, count)
+            SELECT substr(timestamp, 1, 10), COALESCE(action, ''), COALESCE(currency, ''), COUNT(*)
+            FROM logs WHERE id BETWEEN ? AND ? AND timestamp < ?
+            GROUP BY 1, 2, 3
+            ON CONFLICT(day, action, currency) DO UPDATE SET count = count + excluded.count
+        """, chunk)
+        cursor.execute("DELETE FROM logs WHERE id BETWEEN ? AND ? AND timestamp < ?", chunk)
+        processed = cursor.rowcount
+        conn.commit()
+        return processed
+
+def prune_hourly_stats(cutoff: str) -> int:
+    """Видаляє погодинні лічильники, старіші за cutoff"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM stats_counters WHERE key >= 'hour:' AND key < ?", (f"hour:{cutoff[:13]}",))
+        conn.commit()
+        return cursor.rowcount
+
+def incremental_vacuum(pages: int = 0) -> int:
+    """Повертає файлу вільні сторінки (0 — усі), повертає кількість звільнених"""
+    cursor = get_connection().cursor()
+    cursor.execute("PRAGMA freelist_count")
+    before = cursor.fetchone()[0]
+    cursor.execute(f"PRAGMA incremental_vacuum({int(pages)})")
+    cursor.fetchall()
+    cursor.execute("PRAGMA freelist_count")
+    return before - cursor.fetchone()[0]
+
 def get_global_stats():
+    """Повертає (користувачів, запитів) з лічильників, без COUNT(*) по таблицях"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        users, actions = _get_counters(cursor, ["users", "actions"])
+        return users, actions
+
+def get_stats_report(days: int = 7) -> dict:
+    """Розгорнута статистика: загальні лічильники, розбивка за діями, валютами та днями (UTC)"""
+    now = datetime.now(timezone.utc)
+    day_keys = [f"day:{(now - timedelta(days=i)):%Y-%m-%d}" for i in range(days)]
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        users, actions, last_hour, *per_day = _get_counters(
+            cursor, ["users", "actions", f"hour:{now:%Y-%m-%d %H}"] + day_keys
+        )
+        return {
+            "users": users,
+            "actions": actions,
+            "last_hour": last_hour,
+            "days": [(k[4:], v) for k, v in zip(day_keys, per_day)],
+            "by_action": _get_counters_by_prefix(cursor, "action"),
+            "by_currency": _get_counters_by_prefix(cursor, "currency"),
+        }
+
+# --- Сховище станів FSM ---
+
+def fsm_load(key: str):
+    """Повертає (state, data_json, expires_at) або None"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT state, data, expires_at FROM fsm_storage WHERE key = ?", (key,))
+        return cursor.fetchone()
+
+def fsm_save(upserts, deletes):
+    """Записує пачку змінених ключів [(key, state, data_json, expires_at), ...] однією транзакцією"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        if upserts:
+            cursor.executemany("""
+                INSERT OR REPLACE INTO fsm_storage (key, state, data, expires_at)
+                VALUES (?, ?, ?, ?)
+            """, upserts)
+        if deletes:
+            cursor.executemany("DELETE FROM fsm_storage WHERE key = ?", [(k,) for k in deletes])
+        conn.commit()
+
+def fsm_purge_expired(now: float) -> int:
+    """Видаляє прострочені стани, повертає кількість видалених"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM fsm_storage WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        conn.commit()
+        return cursor.rowcount
+
+# --- Підписки та розсилки ---
+
+def toggle_subscription(user_id: int, currency: str) -> bool:
+    """Підписує або відписує користувача. Повертає True, якщо тепер підписаний"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM subscriptions WHERE user_id = ? AND currency = ?", (user_id, currency.upper()))
+        subscribed = cursor.rowcount == 0
+        if subscribed:
+            cursor.execute("INSERT INTO subscriptions (user_id, currency) VALUES (?, ?)", (user_id, currency.upper()))
+        conn.commit()
+        return subscribed
+
+def remove_subscriber(user_id: int):
+    """Прибирає всі підписки користувача (напр. заблокував бота)"""
+    with get_connection() as conn:
+        conn.execute("DELETE FROM subscriptions WHERE user_id = ?", (user_id,))
+        conn.commit()
+
+def get_subscribers_page(currency: str, after_user_id: int, limit: int):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT user_id FROM subscriptions
+            WHERE currency = ? AND user_id > ?
+            ORDER BY user_id LIMIT ?
+        """, (currency.upper(), after_user_id, limit))
+        return [row[0] for row in cursor.fetchall()]
+
+def create_broadcast(currency: str, text: str) -> int:
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO broadcasts (currency, text) VALUES (?, ?)", (currency.upper(), text))
+        conn.commit()
+        return cursor.lastrowid
+
+def claim_broadcast(owner: str, now: float, lease: float):
+    """Забирає найстарішу незавершену розсилку, чия оренда вільна, прострочена або вже наша.
+
+    Розсилки беруться по одній: оренду продовжує лише та, що надсилається, тож решта
+    не застрягає за процесом, який зайнятий довгою розсилкою. Так після перезапуску
+    (або при кількох інстансах) кожну розсилку веде лише один процес.
+    Повертає (id, currency, text, last_user_id, sent, failed) або None.
+    """
+    claimable = "status IN ('pending', 'running') AND (owner IS NULL OR owner = ? OR lease_until < ?)"
     with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM users")
-        users = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM logs")
-        actions = cursor.fetchone()[0]
-        return users, actions
\ No newline at end of file
+        cursor.execute(f"SELECT id FROM broadcasts WHERE {claimable} ORDER BY id LIMIT 1", (owner, now))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        # Умова повторюється в UPDATE: якщо інший процес встиг першим, рядок не зміниться
+        cursor.execute(
+            f"UPDATE broadcasts SET status = 'running', owner = ?, lease_until = ? WHERE id = ? AND {claimable}",
+            (owner, now + lease, row[0], owner, now)
+        )
+        claimed = cursor.rowcount == 1
+        conn.commit()
+        if not claimed:
+            return None
+        cursor.execute(
+            "SELECT id, currency, text, last_user_id, sent, failed FROM broadcasts WHERE id = ?", (row[0],)
+        )
+        return cursor.fetchone()
+
+def save_broadcast_progress(broadcast_id: int, owner: str, last_user_id: int, sent: int, failed: int,
+                            lease_until: float, finished: bool = False) -> bool:
+    """Зберігає прогрес, лише поки розсилка належить owner. False — її перехопив інший процес"""
+    with get_connection() as conn:
+        cursor = conn.execute("""
+            UPDATE broadcasts
+            SET last_user_id = ?, sent = ?, failed = ?, lease_until = ?,
+                status = CASE WHEN ? THEN 'done' ELSE status END,
+                finished_at = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE finished_at END
+            WHERE id = ? AND owner = ?
+        """, (last_user_id, sent, failed, lease_until, finished, finished, broadcast_id, owner))
+        conn.commit()
+        return cursor.rowcount == 1
\ No newline at end of file
@@ -3,8 +3,16 @@ import logging
 from aiogram import types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from config import ADMIN_PASSWORD
-from database import set_rate, get_rate, log_action, get_global_stats
+from config import ADMIN_PASSWORD, INLINE_CACHE_TIME
+from history import parse_period, get_history, render_history
+from inline_mode import get_inline_results
+from conversion import BASE_CURRENCY, get_cross_rates, parse_amount, apply_rate, convert, validate_rate
+from scheduler import update_scheduler
+from keyboards import OPERATION_TYPE_KEYBOARD, get_currency_keyboard, get_rate_card
+from async_database import (
+    set_rate, set_rates, get_rates_snapshot, log_action, get_stats_report,
+    toggle_subscription
+)
 
 # --- Стани бота (FSM) ---
 class BotStates(StatesGroup):
@@ -20,34 +28,6 @@ main_menu = types.ReplyKeyboardMarkup(
     resize_keyboard=True
 )
 
-def currency_buttons():
-    return types.InlineKeyboardMarkup(inline_keyboard=[
-        [types.InlineKeyboardButton(text="💵USD новий", callback_data="currency_USD"),
-         types.InlineKeyboardButton(text="🇺🇸USD старий", callback_data="currency_USDW")],
-        [types.InlineKeyboardButton(text="🇪🇺EUR", callback_data="currency_EUR"),
-         types.InlineKeyboardButton(text="🇵🇱PLN", callback_data="currency_PLN")],
-        [types.InlineKeyboardButton(text="🇬🇧GBP", callback_data="currency_GBP"),
-         types.InlineKeyboardButton(text="🇨🇦CAD", callback_data="currency_CAD")],
-        [types.InlineKeyboardButton(text="🇨🇿CZK", callback_data="currency_CZK"),
-         types.InlineKeyboardButton(text="🇸🇪SEK", callback_data="currency_SEK")],
-        [types.InlineKeyboardButton(text="🇨🇭CHF", callback_data="currency_CHF")]
-    ])
-
-def calculation_choice_buttons():
-    return types.InlineKeyboardMarkup(inline_keyboard=[[
-        types.InlineKeyboardButton(text="🧮 Розрахувати суму", callback_data="confirm_calc"),
-        types.InlineKeyboardButton(text="❌ Відміна", callback_data="cancel_calc")
-    ]])
-
-def operation_type_buttons():
-    return types.InlineKeyboardMarkup(inline_keyboard=[
-        [
-            types.InlineKeyboardButton(text="Купляємо валюту(ми беремо)", callback_data="op_buy"),
-            types.InlineKeyboardButton(text="Продаємо валюту(ми видаємо)", callback_data="op_sell")
-        ],
-        [types.InlineKeyboardButton(text="⬅️ Назад", callback_data="cancel_calc")]
-    ])
-
 # --- Хендлери користувача ---
 async def start_handler(message: types.Message, state: FSMContext):
     await state.clear()
@@ -60,7 +40,8 @@ async def start_handler(message: types.Message, state: FSMContext):
 
 async def menu_handler(message: types.Message, state: FSMContext):
     if message.text == "💱 Курс валют":
-        await message.answer("Оберіть валюту для перегляду курсу:", reply_markup=currency_buttons())
+        keyboard = get_currency_keyboard(await get_rates_snapshot())
+        await message.answer("Оберіть валюту для перегляду курсу:", reply_markup=keyboard)
     elif message.text == "ℹ️ Допомога":
         await message.answer(
             "📖 **Як користуватися ботом:**\n"
@@ -83,29 +64,30 @@ async def menu_handler(message: types.Message, state: FSMContext):
         
 async def currency_callback(callback: types.CallbackQuery, state: FSMContext):
     currency = callback.data.replace("currency_", "")
-    rates = get_rate(currency) # Тепер очікуємо кортеж (buy, sell)
+    # Текст і клавіатура картки готуються один раз на версію курсів
+    card = get_rate_card(currency, await get_rates_snapshot())
     
-    if not rates:
+    if card is None:
         await callback.answer("❌ Курс ще не встановлено", show_alert=True)
         return
 
-    buy, sell = rates
-    await state.update_data(chosen_currency=currency, rate_buy=buy, rate_sell=sell)
+    await state.update_data(chosen_currency=currency, rate_buy=card.buy, rate_sell=card.sell)
     
-    await callback.message.answer(
-        f"📊 **Курс {currency}:**\n"
-        f"Купівля: `{buy:.2f} UAH`\n"
-        f"Продаж: `{sell:.2f} UAH`\n\n"
-        "Бажаєте розрахувати конкретну суму?",
-        reply_markup=calculation_choice_buttons(),
-        parse_mode="Markdown"
-    )
+    await callback.message.answer(card.text, reply_markup=card.keyboard, parse_mode="Markdown")
     await callback.answer()
-    log_action(callback.from_user.id, "view_rate", currency)
+    await log_action(callback.from_user.id, "view_rate", currency)
+
+async def subscription_callback(callback: types.CallbackQuery):
+    # Кнопка перемикає підписку, тож показ картки курсу не потребує запиту до бази
+    currency = callback.data.replace("sub_", "")
+    if await toggle_subscription(callback.from_user.id, currency):
+        await callback.answer(f"🔔 Ви отримаєте повідомлення, коли курс {currency} зміниться", show_alert=True)
+    else:
+        await callback.answer(f"🔕 Підписку на {currency} скасовано", show_alert=True)
 
 async def calc_choice_handler(callback: types.CallbackQuery, state: FSMContext):
     if callback.data == "confirm_calc":
-        await callback.message.edit_text("Оберіть тип операції:", reply_markup=operation_type_buttons())
+        await callback.message.edit_text("Оберіть тип операції:", reply_markup=OPERATION_TYPE_KEYBOARD)
     elif callback.data == "cancel_calc":
         await state.clear()
         await callback.message.edit_text("🏠 Скасовано. Оберіть валюту в меню")
@@ -123,35 +105,37 @@ async def operation_type_handler(callback: types.CallbackQuery, state: FSMContex
     await callback.message.edit_text(f"💰 Введіть суму в **{currency}**, яку ви хочете {action_text}:")
 
 async def convert_handler(message: types.Message, state: FSMContext):
-    if len(message.text) > 12:
-        await message.answer("⚠️ Число занадто велике")
+    # Decimal і те саме округлення, що в /convert та inline-режимі
+    amount = parse_amount(message.text or "")
+    if amount is None:
+        await message.answer("🔢 Вкажіть суму числом більше нуля (до 9 цифр, до 2 знаків після коми)")
         return
 
     data = await state.get_data()
     currency = data.get("chosen_currency")
     op_type = data.get("op_type")
     
+    # Курс, показаний у картці валюти: купівлі чи продажу залежно від операції
     rate = data.get("rate_buy") if op_type == "buy" else data.get("rate_sell")
+    if rate is None:
+        await state.clear()
+        await message.answer("🏠 Оберіть валюту в меню ще раз")
+        return
 
-    try:
-        amount = float(message.text.replace(",", ".").strip())
-        if amount <= 0:
-            await message.answer("⚠️ Введіть число більше нуля")
-            return
-
-        result = amount * rate
-        action_name = "Купівля" if op_type == "buy" else "Продаж"
-        
-        await message.answer(
-            f"✅ **Результат ({action_name}):**\n"
-            f"{amount} {currency} = **{result:.2f} UAH**\n\n"
-            f"_За курсом {rate:.2f}_",
-            parse_mode="Markdown"
-        )
-        await state.clear() # Очищуємо після розрахунку
-        log_action(message.from_user.id, f"convert_{op_type}", currency)
-    except ValueError:
-        await message.answer("🔢 Будь ласка, введіть число")
+    result = apply_rate(amount, rate)
+    if result is None:
+        await message.answer("⚠️ Сума завелика")
+        return
+    action_name = "Купівля" if op_type == "buy" else "Продаж"
+    
+    await message.answer(
+        f"✅ **Результат ({action_name}):**\n"
+        f"{amount} {currency} = **{result} {BASE_CURRENCY}**\n\n"
+        f"_За курсом {rate:.2f}_",
+        parse_mode="Markdown"
+    )
+    await state.clear() # Очищуємо після розрахунку
+    await log_action(message.from_user.id, f"convert_{op_type}", currency)
 
 # --- Адмін-функції ---
 
@@ -174,11 +158,106 @@ async def set_rate_handler(message: types.Message, state: FSMContext):
     try:
         # Формат: /setrate USD 41.2 41.8
         _, currency, buy, sell = message.text.split()
-        set_rate(currency.upper(), float(buy.replace(",", ".")), float(sell.replace(",", ".")))
-        await message.answer(f"✅ Курс {currency.upper()} оновлено:\nКупівля: {buy}\nПродаж: {sell}")
+        currency = currency.upper()
+        rate_buy, rate_sell = float(buy.replace(",", ".")), float(sell.replace(",", "."))
+        error = validate_rate(currency, rate_buy, rate_sell)
+        if error:
+            await message.answer(f"⚠️ Курс не змінено: {error}")
+            return
+        await set_rate(currency, rate_buy, rate_sell)
+        await message.answer(f"✅ Курс {currency} оновлено:\nКупівля: {buy}\nПродаж: {sell}")
     except:
         await message.answer("⚠️ Формат: `/setrate USD 41.2 41.8` ")
 
+# --- Масове оновлення курсів ---
+MAX_RATES_FILE_SIZE = 64 * 1024
+RATES_TABLE_HEADERS = {("currency", "buy", "sell"), ("валюта", "купівля", "продаж")}
+
+def _split_rates_line(line: str):
+    # "USD 41.2 41.8", "USD;41,2;41,8", "USD\t41.2\t41.8" або CSV "USD,41.2,41.8"
+    # CSV — лише коли коми розділяють рівно три поля без пробілів усередині ("USD, 41.2, 41.8")
+    fields = [field.strip() for field in line.split(",")]
+    if ";" not in line and "\t" not in line and len(fields) == 3 and all(len(f.split()) == 1 for f in fields):
+        return fields
+    return line.replace(";", " ").replace("\t", " ").split()
+
+def parse_rates_table(text: str):
+    """Перевіряє всі рядки. Повертає (rows, errors), де rows — [(line_no, currency, buy, sell)]"""
+    rows, errors, seen = [], [], set()
+    for line_no, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        parts = _split_rates_line(line)
+        if line_no == 1 and tuple(part.lower() for part in parts) in RATES_TABLE_HEADERS:
+            continue  # Заголовок CSV: currency,buy,sell
+        if len(parts) != 3:
+            errors.append(f"❌ Рядок {line_no}: очікується `ВАЛЮТА КУПІВЛЯ ПРОДАЖ`")
+            continue
+        currency = parts[0].upper()
+        try:
+            buy, sell = (float(value.replace(",", ".")) for value in parts[1:])
+        except ValueError:
+            errors.append(f"❌ Рядок {line_no}: курс має бути числом")
+            continue
+        error = validate_rate(currency, buy, sell)
+        if error:
+            errors.append(f"❌ Рядок {line_no}: {error}")
+        elif currency in seen:
+            errors.append(f"❌ Рядок {line_no}: {currency} вже є вище")
+        else:
+            seen.add(currency)
+            rows.append((line_no, currency, buy, sell))
+    return rows, errors
+
+async def apply_rates_table(message: types.Message, text: str):
+    rows, errors = parse_rates_table(text)
+    if errors:
+        await message.answer("⚠️ Курси не змінено, виправте помилки:\n" + "\n".join(errors))
+        return
+    if not rows:
+        await message.answer("⚠️ Список курсів порожній")
+        return
+
+    # Усі рядки валідні — застосовуємо одним записом
+    version, changes = await set_rates([(currency, buy, sell) for _, currency, buy, sell in rows])
+    changed = {currency for currency, _, _ in changes}
+    lines = [
+        f"{'✅' if currency in changed else '➖'} {currency}: {buy:.2f} / {sell:.2f}"
+        + ("" if currency in changed else " (без змін)")
+        for _, currency, buy, sell in rows
+    ]
+    await message.answer(
+        f"📥 Оновлено курсів: {len(changed)} з {len(rows)} (версія {version})\n" + "\n".join(lines)
+    )
+
+async def set_rates_handler(message: types.Message, state: FSMContext):
+    if await state.get_state() != BotStates.admin_active:
+        await message.answer("⛔ Спочатку /login")
+        return
+    # Формат: /setrates, далі по рядку на валюту: USD 41.2 41.8
+    parts = message.text.split(maxsplit=1)
+    if len(parts) < 2:
+        await message.answer(
+            "⚠️ Формат:\n/setrates\nUSD 41.2 41.8\nEUR 44.5 45.3\n\nАбо надішліть CSV-файл: `USD,41.2,41.8`"
+        )
+        return
+    await apply_rates_table(message, parts[1])
+
+async def rates_document_handler(message: types.Message, state: FSMContext):
+    if await state.get_state() != BotStates.admin_active:
+        await message.answer("⛔ Спочатку /login")
+        return
+    if message.document.file_size and message.document.file_size > MAX_RATES_FILE_SIZE:
+        await message.answer("⚠️ Файл завеликий")
+        return
+    content = await message.bot.download(message.document)
+    try:
+        text = content.read().decode("utf-8-sig")
+    except UnicodeDecodeError:
+        await message.answer("⚠️ Файл має бути текстовим (UTF-8)")
+        return
+    await apply_rates_table(message, text)
+
 async def logout_handler(message: types.Message, state: FSMContext):
     await state.clear()
     await message.answer("🔒 Вихід виконано")
@@ -190,15 +269,36 @@ async def show_admin_panel(message: types.Message):
     ])
     await message.answer("⚙️ **Адмін-панель:**", reply_markup=kb, parse_mode="Markdown")
 
+def format_stats(report: dict) -> str:
+    lines = [
+        f"📊 Користувачів: {report['users']}",
+        f"Запитів: {report['actions']}",
+        f"За останню годину: {report['last_hour']}",
+    ]
+    if report["by_currency"]:
+        lines.append("\n💱 За валютами:")
+        lines += [f"{currency}: {count}" for currency, count in report["by_currency"]]
+    if report["by_action"]:
+        lines.append("\n🔘 За діями:")
+        lines += [f"{action}: {count}" for action, count in report["by_action"]]
+    lines.append("\n📅 За днями (UTC):")
+    lines += [f"{day}: {count}" for day, count in report["days"]]
+    return "\n".join(lines)
+
 async def admin_callback(callback: types.CallbackQuery, state: FSMContext):
     if await state.get_state() != BotStates.admin_active:
         await callback.answer("❌ Сесія завершена", show_alert=True)
         return
     if callback.data == "admin_stats":
-        u, a = get_global_stats()
-        await callback.message.answer(f"📊 Користувачів: {u}\nЗапитів: {a}")
+        if update_scheduler.overloaded:
+            await callback.answer("⏳ Бот зараз під навантаженням, спробуйте пізніше", show_alert=True)
+            return
+        await callback.message.answer(format_stats(await get_stats_report()))
     elif callback.data == "admin_edit":
-        await callback.message.answer("Команда: `/setrate ВАЛЮТА КУПІВЛЯ ПРОДАЖ`")
+        await callback.message.answer(
+            "Команда: `/setrate ВАЛЮТА КУПІВЛЯ ПРОДАЖ`\n"
+            "Кілька валют: `/setrates` і по рядку на валюту, або CSV-файл"
+        )
     await callback.answer()
     
 async def get_rate_handler(message: types.Message):
@@ -209,18 +309,64 @@ async def get_rate_handler(message: types.Message):
             return
             
         curr = parts[1].upper()
-        rates = get_rate(curr)
+        card = get_rate_card(curr, await get_rates_snapshot())
         
-        if rates:
-            buy, sell = rates
-            await message.answer(
-                f"💱 **Курс {curr}:**\n"
-                f"🔵 Купівля: `{buy:.2f} UAH`\n"
-                f"🔴 Продаж: `{sell:.2f} UAH`", 
-                parse_mode="Markdown"
-            )
+        if card:
+            await message.answer(card.command_text, parse_mode="Markdown")
         else:
             await message.answer(f"❌ Валюту {curr} не знайдено в базі")
     except Exception as e:
         logging.error(f"Error in get_rate_handler: {e}")
-        await message.answer("⚠️ Помилка при отриманні курсу")
\ No newline at end of file
+        await message.answer("⚠️ Помилка при отриманні курсу")
+
+async def cross_convert_handler(message: types.Message):
+    # Формат: /convert 100 EUR PLN (без другої валюти — у гривню)
+    parts = message.text.split()
+    if len(parts) not in (3, 4):
+        await message.answer("Використання: `/convert 100 EUR PLN`", parse_mode="Markdown")
+        return
+
+    amount = parse_amount(parts[1])
+    if amount is None:
+        await message.answer("🔢 Вкажіть суму числом більше нуля (до 9 цифр, до 2 знаків після коми)")
+        return
+    src = parts[2].upper()
+    dst = parts[3].upper() if len(parts) == 4 else BASE_CURRENCY
+
+    matrix = get_cross_rates(await get_rates_snapshot())
+    converted = convert(matrix, amount, src, dst)
+    if converted is None:
+        await message.answer(f"❌ Немає курсу для пари {src} → {dst}")
+        return
+
+    result, rate = converted
+    await message.answer(
+        f"✅ **{amount} {src} = {result} {dst}**\n\n"
+        f"_1 {src} = {rate:.4f} {dst} (купівля {src} / продаж {dst})_",
+        parse_mode="Markdown"
+    )
+    await log_action(message.from_user.id, "convert_cross", src)
+
+async def history_handler(message: types.Message):
+    parts = message.text.split()
+    if len(parts) < 2:
+        await message.answer("Використання: `/history USD 30d` (h, d, w, m, y)", parse_mode="Markdown")
+        return
+
+    curr = parts[1].upper()
+    period = parts[2].lower() if len(parts) > 2 else "30d"
+    seconds = parse_period(period)
+    if seconds is None:
+        await message.answer("⚠️ Період у форматі `12h`, `30d`, `2w`, `6m`, `1y` (до 5 років)", parse_mode="Markdown")
+        return
+
+    series = await get_history(curr, seconds)
+    if not series:
+        await message.answer(f"❌ Історії для {curr} за цей період немає")
+        return
+    await message.answer(render_history(curr, period, series), parse_mode="Markdown")
+
+# --- Inline-режим: @bot 250 eur ---
+async def inline_handler(inline_query: types.InlineQuery):
+    results = get_inline_results(inline_query.query, await get_rates_snapshot())
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=False)
\ No newline at end of file
@@ -0,0 +1,85 @@
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+import async_database
+import database
+
+PERIOD_UNITS = {"h": 3600, "d": 86400, "w": 7 * 86400, "m": 30 * 86400, "y": 365 * 86400}
+MAX_PERIOD = 5 * 365 * 86400
+POINTS = 24
+SPARKS = "▁▂▃▄▅▆▇█"
+
+# Готові ряди для графіка: (currency, seconds, points, кошик часу) -> series.
+# Дійсні до наступної зміни курсів і поки вікно не зсунулося на наступний кошик
+_cache = {}
+_cache_version = None
+_CACHE_LIMIT = 256
+
+
+def parse_period(text: str):
+    """'30d', '12h', '2w', '6m', '1y' -> секунди або None"""
+    match = re.fullmatch(r"(\d{1,4})([hdwmy])", text.lower())
+    if not match:
+        return None
+    seconds = int(match.group(1)) * PERIOD_UNITS[match.group(2)]
+    return seconds if 0 < seconds <= MAX_PERIOD else None
+
+
+def _build_series(currency: str, seconds: int, points: int):
+    since = datetime.now(timezone.utc) - timedelta(seconds=seconds)
+    bucket_seconds = max(seconds // points, 1)
+    opening, buckets = database.get_rate_history(currency, since, bucket_seconds)
+
+    # Рівномірний ряд: у кошиках без змін діє попередній курс
+    # (зміна рівно в момент запиту дає кошик №points — відносимо її до останнього)
+    by_bucket = {min(bucket, points - 1): (buy, sell) for bucket, buy, sell in buckets}
+    current = opening
+    series = []
+    for bucket in range(points):
+        current = by_bucket.get(bucket, current)
+        if current is not None:
+            series.append((since + timedelta(seconds=bucket * bucket_seconds), *current))
+    return series
+
+
+async def get_history(currency: str, seconds: int, points: int = POINTS):
+    """Повертає [(datetime, buy, sell), ...] для графіка; кешується до зміни курсів або зсуву вікна"""
+    global _cache_version
+    version, _ = await async_database.get_rates_snapshot()  # звіряє кеш зі змінами інших процесів
+    if version != _cache_version or len(_cache) >= _CACHE_LIMIT:
+        _cache.clear()
+        _cache_version = version
+    # Без часу в ключі незмінні кілька днів курси показували б вікно першого запиту
+    window = int(time.time()) // max(seconds // points, 1)
+    key = (currency.upper(), seconds, points, window)
+    series = _cache.get(key)
+    if series is None:
+        series = _cache[key] = await async_database.run(_build_series, currency, seconds, points)
+    return series
+
+
+def _sparkline(values):
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARKS[len(SPARKS) // 2] * len(values)
+    return "".join(SPARKS[int((v - low) / (high - low) * (len(SPARKS) - 1))] for v in values)
+
+
+def render_history(currency: str, period: str, series) -> str:
+    first, last = series[0], series[-1]
+    sells = [sell for _, _, sell in series]
+    buys = [buy for _, buy, _ in series]
+    lines = [
+        f"📈 **{currency.upper()} за {period}:**",
+        f"`{_sparkline(sells)}`",
+        f"🔵 Купівля: `{first[1]:.2f} → {last[1]:.2f}` (мін {min(buys):.2f}, макс {max(buys):.2f})",
+        f"🔴 Продаж: `{first[2]:.2f} → {last[2]:.2f}` (мін {min(sells):.2f}, макс {max(sells):.2f})",
+        "",
+    ]
+    # Лише точки, де курс змінювався, не більше 10 останніх
+    changes = [point for i, point in enumerate(series) if i == 0 or point[1:] != series[i - 1][1:]]
+    for moment, buy, sell in changes[-10:]:
+        lines.append(f"{moment:%d.%m %H:%M} — {buy:.2f} / {sell:.2f}")
+    lines.append("_Час UTC_")
+    return "\n".join(lines)
@@ -0,0 +1,116 @@
+import re
+from collections import OrderedDict
+
+from aiogram import types
+
+from conversion import AMOUNT_PATTERN, BASE_CURRENCY, apply_rate, convert, get_cross_rates, parse_amount
+
+# "250 eur", "eur 250", "250eur", "99,5 USD", а також крос-курс "250 eur pln" / "250 eur в pln"
+QUERY_PATTERN = re.compile(
+    rf"^\s*(?:(?P<amount>{AMOUNT_PATTERN})\s*(?P<currency>[a-zA-Z]{{2,10}})"
+    rf"|(?P<currency2>[a-zA-Z]{{2,10}})\s*(?P<amount2>{AMOUNT_PATTERN}))"
+    r"(?:\s+(?:to\s+|в\s+)?(?P<target>[a-zA-Z]{2,10}))?\s*$",
+    re.IGNORECASE
+)
+CACHE_SIZE = 2048
+
+# ((amount, currency, target), версія курсів) -> готовий список результатів
+_results_cache = OrderedDict()
+
+
+def parse_inline_query(text: str):
+    """Повертає (amount, CURRENCY, TARGET або None), або None, якщо запит не схожий на суму з валютою"""
+    match = QUERY_PATTERN.match(text)
+    if not match:
+        return None
+    amount = match.group("amount") or match.group("amount2")
+    currency = match.group("currency") or match.group("currency2")
+    amount = parse_amount(amount)
+    if amount is None:
+        return None
+    target = match.group("target")
+    return amount, currency.upper(), target.upper() if target else None
+
+
+def _fmt(value: float) -> str:
+    return f"{value:,.2f}".replace(",", " ")
+
+
+def _article(result_id: str, title: str, description: str, text: str):
+    return types.InlineQueryResultArticle(
+        id=result_id,
+        title=title,
+        description=description,
+        input_message_content=types.InputTextMessageContent(message_text=text, parse_mode="Markdown"),
+    )
+
+
+def _build_conversion(currency: str, amount, buy: float, sell: float):
+    results = []
+    for op_type, action_name, rate in (("buy", "Купівля", buy), ("sell", "Продаж", sell)):
+        # Те саме округлення Decimal, що в /convert і розрахунку через кнопки
+        result = apply_rate(amount, rate)
+        if result is None:
+            continue
+        results.append(_article(
+            f"{currency}-{amount}-{op_type}",
+            f"{action_name}: {_fmt(amount)} {currency} = {_fmt(result)} {BASE_CURRENCY}",
+            f"За курсом {rate:.2f}",
+            f"✅ **Результат ({action_name}):**\n"
+            f"{_fmt(amount)} {currency} = **{_fmt(result)} {BASE_CURRENCY}**\n\n"
+            f"_За курсом {rate:.2f}_",
+        ))
+    return results
+
+
+def _build_cross(matrix: dict, amount, src: str, dst: str):
+    converted = convert(matrix, amount, src, dst)
+    if converted is None:
+        return []
+    result, rate = converted
+    return [_article(
+        f"{src}-{dst}-{amount}",
+        f"{_fmt(amount)} {src} = {_fmt(result)} {dst}",
+        f"1 {src} = {rate:.4f} {dst}",
+        f"✅ **{_fmt(amount)} {src} = {_fmt(result)} {dst}**\n\n_1 {src} = {rate:.4f} {dst}_",
+    )]
+
+
+def _build_overview(rates: dict):
+    return [
+        _article(
+            f"rate-{currency}",
+            f"{currency}: {buy:.2f} / {sell:.2f} UAH",
+            "Купівля / продаж",
+            f"💱 **Курс {currency}:**\n🔵 Купівля: `{buy:.2f} UAH`\n🔴 Продаж: `{sell:.2f} UAH`",
+        )
+        for currency, (buy, sell) in sorted(rates.items())
+    ]
+
+
+def get_inline_results(query: str, snapshot):
+    """Результати для inline-запиту з LRU-кешу; порожній запит — огляд усіх курсів"""
+    version, rates = snapshot
+    parsed = parse_inline_query(query)
+    if parsed is None and query.strip():
+        return []
+    key = (parsed, version)
+    results = _results_cache.get(key)
+    if results is not None:
+        _results_cache.move_to_end(key)
+        return results
+
+    if parsed is None:
+        results = _build_overview(rates)
+    else:
+        amount, currency, target = parsed
+        rate = rates.get(currency)
+        if target:
+            results = _build_cross(get_cross_rates(snapshot), amount, currency, target)
+        else:
+            results = _build_conversion(currency, amount, *rate) if rate else []
+
+    _results_cache[key] = results
+    if len(_results_cache) > CACHE_SIZE:
+        _results_cache.popitem(last=False)
+    return results
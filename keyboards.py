@@ -0,0 +1,100 @@
+from aiogram import types
+
+# Підписи відомих валют у порядку показу; решта валют з таблиці rates іде після них за абеткою
+CURRENCY_LABELS = {
+    "USD": "💵USD новий",
+    "USDW": "🇺🇸USD старий",
+    "EUR": "🇪🇺EUR",
+    "PLN": "🇵🇱PLN",
+    "GBP": "🇬🇧GBP",
+    "CAD": "🇨🇦CAD",
+    "CZK": "🇨🇿CZK",
+    "SEK": "🇸🇪SEK",
+    "CHF": "🇨🇭CHF",
+}
+BUTTONS_PER_ROW = 2
+
+# Статичні клавіатури будуються один раз
+OPERATION_TYPE_KEYBOARD = types.InlineKeyboardMarkup(inline_keyboard=[
+    [
+        types.InlineKeyboardButton(text="Купляємо валюту(ми беремо)", callback_data="op_buy"),
+        types.InlineKeyboardButton(text="Продаємо валюту(ми видаємо)", callback_data="op_sell")
+    ],
+    [types.InlineKeyboardButton(text="⬅️ Назад", callback_data="cancel_calc")]
+])
+
+
+class RateCard:
+    """Готова картка валюти: текст для кнопки, текст для /getrate і клавіатура"""
+
+    __slots__ = ("buy", "sell", "text", "command_text", "keyboard")
+
+    def __init__(self, currency: str, buy: float, sell: float):
+        self.buy = buy
+        self.sell = sell
+        self.text = (
+            f"📊 **Курс {currency}:**\n"
+            f"Купівля: `{buy:.2f} UAH`\n"
+            f"Продаж: `{sell:.2f} UAH`\n\n"
+            "Бажаєте розрахувати конкретну суму?"
+        )
+        self.command_text = (
+            f"💱 **Курс {currency}:**\n"
+            f"🔵 Купівля: `{buy:.2f} UAH`\n"
+            f"🔴 Продаж: `{sell:.2f} UAH`"
+        )
+        self.keyboard = calculation_choice_buttons(currency)
+
+
+def calculation_choice_buttons(currency: str):
+    return types.InlineKeyboardMarkup(inline_keyboard=[
+        [
+            types.InlineKeyboardButton(text="🧮 Розрахувати суму", callback_data="confirm_calc"),
+            types.InlineKeyboardButton(text="❌ Відміна", callback_data="cancel_calc")
+        ],
+        [types.InlineKeyboardButton(text="🔔 Стежити за курсом", callback_data=f"sub_{currency}")]
+    ])
+
+
+def _currency_order(currency: str):
+    order = list(CURRENCY_LABELS)
+    return (order.index(currency), "") if currency in CURRENCY_LABELS else (len(order), currency)
+
+
+def build_currency_keyboard(currencies):
+    """Клавіатура вибору валюти з тих валют, для яких є курс"""
+    buttons = [
+        types.InlineKeyboardButton(text=CURRENCY_LABELS.get(currency, currency), callback_data=f"currency_{currency}")
+        for currency in sorted(currencies, key=_currency_order)
+    ]
+    return types.InlineKeyboardMarkup(inline_keyboard=[
+        buttons[i:i + BUTTONS_PER_ROW] for i in range(0, len(buttons), BUTTONS_PER_ROW)
+    ])
+
+
+# Клавіатура валют і картки для поточної версії курсів
+_currency_keyboard = None
+_cards = {}
+_version = None
+
+
+def _refresh(snapshot):
+    # Версія береться з того ж знімка, що й курси, тож старі курси не потраплять під нову версію
+    global _currency_keyboard, _cards, _version
+    version, rates = snapshot
+    if version != _version:
+        _cards = {currency: RateCard(currency, buy, sell) for currency, (buy, sell) in rates.items()}
+        _currency_keyboard = build_currency_keyboard(rates)
+        _version = version
+
+
+def get_currency_keyboard(snapshot):
+    """Клавіатура валют для знімка (версія, курси); перебудовується лише після зміни курсів"""
+    _refresh(snapshot)
+    return _currency_keyboard
+
+
+def get_rate_card(currency: str, snapshot):
+    """RateCard валюти або None, якщо курс не встановлено"""
+    _refresh(snapshot)
+    return _cards.get(currency.upper())
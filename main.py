@@ -1,14 +1,27 @@
 import asyncio
 import logging
+import signal
 import sys
 import os
 from aiohttp import web  # Додано для веб-сервера
 from aiogram import F
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
 from aiogram.filters import Command
 from aiogram.types import ErrorEvent
 
 from bot import bot, dp
-from database import init_db
+from config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+    RATE_LIMIT_RATE, RATE_LIMIT_BURST, RATE_LIMIT_TTL,
+    LOG_RETENTION_DAYS, LOG_COMPACTION_INTERVAL, LOG_COMPACTION_CHUNK,
+    RATES_FEED_URL, RATES_FEED_INTERVAL,
+)
+import async_database
+import maintenance
+import metrics
+from rate_feed import RateFeed
+from broadcast import Broadcaster
+from scheduler import update_scheduler
 from middlewares import LoggingMiddleware, AntiSpamMiddleware
 import handlers
 from handlers import BotStates
@@ -26,10 +39,24 @@ async def handle(request):
     """Проста відповідь для Render Health Check"""
     return web.Response(text="Бот працює!")
 
+async def handle_metrics(request):
+    """Метрики у форматі Prometheus"""
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
 async def start_web_server():
     """Запуск сервера на порту, який надає Render"""
     app = web.Application()
     app.router.add_get("/", handle)
+    app.router.add_get("/metrics", handle_metrics)
+    if WEBHOOK_URL:
+        # Telegram надсилає оновлення на цей же сервер. Перевіряємо секретний токен
+        # і одразу відповідаємо 200, а обробка йде у фоновій задачі
+        SimpleRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            secret_token=WEBHOOK_SECRET,
+            handle_in_background=True,
+        ).register(app, path=WEBHOOK_PATH)
     runner = web.AppRunner(app)
     await runner.setup()
     
@@ -38,11 +65,13 @@ async def start_web_server():
     site = web.TCPSite(runner, "0.0.0.0", port)
     await site.start()
     logger.info(f"Веб-сервер запущено на порту {port}")
+    return runner
 
 # --- 3. Глобальний захист від падіння ---
 @dp.errors()
 async def error_handler(event: ErrorEvent):
     logger.error(f"Критична помилка: {event.exception}")
+    metrics.HANDLER_ERRORS.inc(type(event.exception).__name__)
     try:
         if event.update.message:
             await event.update.message.answer(
@@ -53,26 +82,41 @@ async def error_handler(event: ErrorEvent):
         logger.error(f"Не вдалося надіслати повідомлення про помилку: {e}")
     return True
 
-async def main():
-    # 4. Ініціалізація бази даних
-    init_db()
-
-    # 5. ЗАПУСК ВЕБ-СЕРВЕРА
-    # Це дозволить Render бачити відкритий порт і тримати сервіс "Live"
-    await start_web_server()
-
-    # 6. Підключення Middlewares
+def setup_dispatcher():
+    """Підключає middlewares і хендлери до dp (використовується також у benchmark.py)"""
+    # 5. Підключення Middlewares
+    # Планувальник: оновлення одного користувача по черзі, загальна паралельність обмежена
+    dp.update.outer_middleware(update_scheduler)
+    metrics.CallbackMetric("bot_updates_queued", "Оновлень у черзі", lambda: update_scheduler.queued)
+    metrics.CallbackMetric("bot_updates_active", "Оновлень в обробці", lambda: update_scheduler.active)
+    metrics.CallbackMetric("bot_updates_shed_total", "Відкинуто через перевантаження", lambda: update_scheduler.shed, "counter")
+    metrics.CallbackMetric(
+        "bot_updates_user_dropped_total", "Відкинуто понад ліміт одного користувача",
+        lambda: update_scheduler.user_dropped, "counter"
+    )
+    # Метрики першими, щоб час хендлера включав і решту middlewares
+    dp.message.middleware(metrics.MetricsMiddleware())
+    dp.callback_query.middleware(metrics.MetricsMiddleware())
     dp.message.middleware(LoggingMiddleware())
-    dp.message.middleware(AntiSpamMiddleware(limit=1.2))
+    # Один екземпляр на повідомлення та кнопки, щоб ліміт був спільним
+    antispam = AntiSpamMiddleware(rate=RATE_LIMIT_RATE, burst=RATE_LIMIT_BURST, ttl=RATE_LIMIT_TTL)
+    dp.message.middleware(antispam)
+    dp.callback_query.middleware(antispam)
+    metrics.CallbackMetric("bot_antispam_users", "Користувачів у лімітері", lambda: len(antispam.buckets))
+    metrics.CallbackMetric("bot_antispam_throttled_total", "Подій з попередженням", lambda: antispam.throttled, "counter")
+    metrics.CallbackMetric("bot_antispam_dropped_total", "Подій, відкинутих мовчки", lambda: antispam.dropped, "counter")
 
-    # --- 7. Реєстрація хендлерів ---
+    # --- 6. Реєстрація хендлерів ---
 
     # Системні команди
     dp.message.register(handlers.start_handler, Command("start"))
     dp.message.register(handlers.login_handler, Command("login"))
     dp.message.register(handlers.logout_handler, Command("logout"))
     dp.message.register(handlers.get_rate_handler, Command("getrate"))
+    dp.message.register(handlers.history_handler, Command("history"))
+    dp.message.register(handlers.cross_convert_handler, Command("convert"))
     dp.message.register(handlers.set_rate_handler, Command("setrate"))
+    dp.message.register(handlers.set_rates_handler, Command("setrates"))
 
     # Обробка головного меню
     dp.message.register(
@@ -86,6 +130,12 @@ async def main():
         F.data.startswith("currency_")
     )
 
+    # Підписка на зміну курсу
+    dp.callback_query.register(
+        handlers.subscription_callback,
+        F.data.startswith("sub_")
+    )
+
     # Підтвердження розрахунку або скасування
     dp.callback_query.register(
         handlers.calc_choice_handler, 
@@ -104,21 +154,92 @@ async def main():
         BotStates.waiting_for_amount
     )
 
+    # Масове оновлення курсів файлом (CSV) від адміна
+    dp.message.register(
+        handlers.rates_document_handler,
+        BotStates.admin_active,
+        F.document
+    )
+
+    # Швидкий розрахунок в inline-режимі (@bot 250 eur)
+    dp.inline_query.register(handlers.inline_handler)
+
     # Адмін-панель
     dp.callback_query.register(
         handlers.admin_callback, 
         F.data.startswith("admin_")
     )
 
+async def wait_for_shutdown_signal():
+    """Чекає SIGTERM (зупинка/передеплой на Render) або SIGINT, щоб завершитися через finally"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
+
+async def main():
+    if WEBHOOK_URL and not WEBHOOK_SECRET:
+        # Без секрету вебхук прийматиме підроблені оновлення від будь-кого
+        raise RuntimeError("WEBHOOK_URL задано без WEBHOOK_SECRET — вебхук не запускаємо")
+
+    # 4. Ініціалізація бази даних
+    await async_database.init_db()
+    async_database.audit_log.start()
+    # Фонова компакція старих логів
+    compaction_task = asyncio.create_task(maintenance.run_log_compaction(
+        LOG_COMPACTION_INTERVAL, LOG_RETENTION_DAYS, LOG_COMPACTION_CHUNK
+    ))
+    loop_lag_task = asyncio.create_task(metrics.monitor_event_loop_lag())
+    # Сповіщення підписників про зміну курсів (продовжує незавершені розсилки)
+    broadcaster = Broadcaster(bot)
+    async_database.rate_change_listeners.append(broadcaster.notify_changes)
+    broadcaster.start()
+    # Автоматичне оновлення курсів із зовнішнього джерела
+    rate_feed = RateFeed(RATES_FEED_URL, interval=RATES_FEED_INTERVAL) if RATES_FEED_URL else None
+    rate_feed_task = asyncio.create_task(rate_feed.run()) if rate_feed else None
+
+    # 5-6. Middlewares та хендлери
+    setup_dispatcher()
+
+    # 7. ЗАПУСК ВЕБ-СЕРВЕРА (після реєстрації хендлерів, бо він же приймає вебхуки)
+    # Це дозволить Render бачити відкритий порт і тримати сервіс "Live"
+    runner = await start_web_server()
+
     # --- 8. Запуск бота ---
     try:
-        logger.info("Бот запущений з підтримкою подвійних курсів та веб-сервером!")
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot)
+        if WEBHOOK_URL:
+            # Кілька інстансів за балансувальником ставлять той самий вебхук,
+            # тому чергу оновлень не скидаємо
+            await bot.set_webhook(
+                url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logger.info(f"Бот запущений у режимі вебхука: {WEBHOOK_PATH}")
+            await wait_for_shutdown_signal()
+            logger.info("Отримано сигнал зупинки, завершуємо роботу")
+        else:
+            logger.info("Бот запущений з підтримкою подвійних курсів та веб-сервером!")
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot)
     except Exception as e:
         logger.critical(f"Помилка при запуску: {e}")
     finally:
+        compaction_task.cancel()
+        loop_lag_task.cancel()
+        if rate_feed_task:
+            rate_feed_task.cancel()
+            await rate_feed.close()
+        await broadcaster.stop()
+        await runner.cleanup()
+        await dp.storage.close()
         await bot.session.close()
+        await async_database.close()
 
 if __name__ == "__main__":
     try:
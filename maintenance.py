@@ -0,0 +1,44 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+import async_database
+import database
+from scheduler import update_scheduler
+
+async def compact_logs(retention_days: int, chunk_size: int = 1000, vacuum_pages: int = 0):
+    """Згортає логи, старіші за retention_days, у денні агрегати та звільняє місце.
+
+    Рядки обробляються порціями по chunk_size, кожна у своїй транзакції, а між ними
+    інші запити до бази встигають виконатись у потоці-воркері.
+    """
+    started = time.monotonic()
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+    processed = 0
+    while True:
+        # Компакція — фонова робота, тож під перевантаженням чекаємо
+        while update_scheduler.overloaded:
+            await asyncio.sleep(1)
+        rows = await async_database.run(database.compact_logs_chunk, cutoff, chunk_size)
+        processed += rows
+        if rows < chunk_size:
+            break
+        await asyncio.sleep(0)
+    pruned = await async_database.run(database.prune_hourly_stats, cutoff)
+    freed = await async_database.run(database.incremental_vacuum, vacuum_pages)
+    logging.info(
+        f"Компакція логів: згорнуто {processed} рядків старших за {cutoff}, "
+        f"видалено погодинних лічильників {pruned}, звільнено сторінок {freed}, "
+        f"тривалість {time.monotonic() - started:.2f} с"
+    )
+    return processed
+
+async def run_log_compaction(interval: float, retention_days: int, chunk_size: int = 1000):
+    """Фонова задача: запускає compact_logs кожні interval секунд"""
+    while True:
+        try:
+            await compact_logs(retention_days, chunk_size)
+        except Exception as e:
+            logging.error(f"Помилка компакції логів: {e}")
+        await asyncio.sleep(interval)
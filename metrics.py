@@ -0,0 +1,137 @@
+import asyncio
+import time
+from bisect import bisect_left
+
+from aiogram import BaseMiddleware
+
+# Межі кошиків гістограм у секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labels, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in list(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Гістограма з фіксованими кошиками: observe() — лише bisect і кілька додавань"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [лічильники по кошиках, сума, кількість]
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in list(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """Значення, яке зчитується в момент запиту /metrics (лічильники інших модулів)"""
+
+    def __init__(self, name, documentation, func, kind="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+        self.kind = kind
+        _registry.append(self)
+
+    def render(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            f"{self.name} {self.func()}",
+        ]
+
+
+def render() -> str:
+    """Усі метрики у текстовому форматі Prometheus"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Метрики бота ---
+HANDLER_LATENCY = Histogram(
+    "bot_handler_duration_seconds", "Час виконання хендлера", ("event", "handler")
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total", "Помилки, що дійшли до error_handler", ("exception",)
+)
+DB_QUERY_DURATION = Histogram(
+    "bot_db_query_duration_seconds", "Час виконання функцій бази даних у потоці-воркері", ("function",)
+)
+EVENT_LOOP_LAG = Histogram(
+    "bot_event_loop_lag_seconds", "Запізнення циклу подій відносно запланованого пробудження"
+)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Записує час виконання обраного хендлера для повідомлень і кнопок"""
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_object = data.get("handler")
+            name = handler_object.callback.__name__ if handler_object else "unknown"
+            HANDLER_LATENCY.observe(time.perf_counter() - started, type(event).__name__, name)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """Фонова задача: наскільки пізніше запланованого прокидається цикл подій"""
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(time.monotonic() - started - interval, 0.0))
@@ -1,33 +1,66 @@
 import time
 import logging
+from collections import OrderedDict
 from aiogram import BaseMiddleware, types
+from scheduler import update_scheduler
 
 class AntiSpamMiddleware(BaseMiddleware):
-    def __init__(self, limit=1.0):
-        self.last_message_time = {}
-        self.limit = limit  # Затримка в секундах
+    """Обмеження частоти за алгоритмом token bucket для повідомлень і натискань кнопок.
 
-    async def __call__(self, handler, event: types.Message, data):
+    Кожен користувач має до `burst` подій поспіль, далі поповнення `rate` подій на секунду.
+    Відра зберігаються в OrderedDict у порядку останньої активності, тож користувачів,
+    неактивних довше за `ttl` секунд, прибираємо з початку словника без повного перебору.
+    """
+
+    def __init__(self, rate=1.0, burst=3, ttl=600):
+        self.rate = rate
+        self.burst = burst
+        self.ttl = ttl
+        self.buckets = OrderedDict()  # user_id -> [tokens, last_seen, warned]
+        self.throttled = 0  # події, на які відповіли попередженням
+        self.dropped = 0    # події, відкинуті мовчки
+
+    def _evict(self, now):
+        buckets = self.buckets
+        while buckets:
+            user_id, bucket = next(iter(buckets.items()))
+            if now - bucket[1] < self.ttl:
+                break
+            buckets.popitem(last=False)
+
+    async def __call__(self, handler, event, data):
         if not event.from_user:
             return await handler(event, data)
-            
+
         user_id = event.from_user.id
-        now = time.time()
+        now = time.monotonic()
+        self._evict(now)
+
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            bucket = self.buckets[user_id] = [float(self.burst), now, False]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self.buckets.move_to_end(user_id)
 
-        if user_id in self.last_message_time:
-            delta = now - self.last_message_time[user_id]
-            if delta < self.limit:
-                # Якщо спамить дуже жорстко — просто ігноруємо (drop request)
-                if delta < 0.5:
-                    return
-                await event.answer("⏳ Занадто часто! Почекайте секунду.")
-                return
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            return await handler(event, data)
 
-        self.last_message_time[user_id] = now
-        return await handler(event, data)
+        if bucket[2]:
+            # Вже попереджали — просто ігноруємо (drop request)
+            self.dropped += 1
+            return
+        bucket[2] = True
+        self.throttled += 1
+        # Для Message це нове повідомлення, для CallbackQuery — спливаюча підказка
+        await event.answer("⏳ Занадто часто! Почекайте секунду.")
 
 class LoggingMiddleware(BaseMiddleware):
     async def __call__(self, handler, event: types.Message, data):
-        if event.text:
+        # Під перевантаженням текстовий лог пропускаємо
+        if event.text and not update_scheduler.overloaded:
             logging.info(f"User {event.from_user.id} sent: {event.text[:50]}") # Логуємо лише перші 50 символів
         return await handler(event, data)
\ No newline at end of file
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+
+import aiohttp
+
+import async_database
+from conversion import validate_rate
+
+
+def parse_rates(payload) -> list:
+    """Перетворює JSON з джерела на [(currency, buy, sell), ...].
+
+    Підтримувані форми:
+      {"USD": {"buy": 41.2, "sell": 41.8}, ...}
+      {"USD": [41.2, 41.8], ...}
+      [{"currency": "USD", "buy": 41.2, "sell": 41.8}, ...]
+    та будь-яка з них усередині {"rates": ...}.
+    """
+    if isinstance(payload, dict) and "rates" in payload:
+        payload = payload["rates"]
+    if isinstance(payload, dict):
+        items = []
+        for currency, value in payload.items():
+            if isinstance(value, dict):
+                items.append((currency, value.get("buy"), value.get("sell")))
+            elif isinstance(value, (list, tuple)) and len(value) == 2:
+                items.append((currency, *value))
+            else:
+                items.append((currency, None, None))
+    elif isinstance(payload, list):
+        items = [(item.get("currency"), item.get("buy"), item.get("sell")) for item in payload if isinstance(item, dict)]
+    else:
+        raise ValueError("Непідтримуваний формат курсів")
+
+    rows = []
+    for currency, buy, sell in items:
+        try:
+            buy, sell = float(buy), float(sell)
+        except (TypeError, ValueError):
+            logging.warning(f"Джерело курсів: пропущено некоректний рядок {currency}")
+            continue
+        # Ті самі правила, що й для /setrates: інакше довгий код зламає клавіатуру валют
+        error = validate_rate(currency.upper(), buy, sell) if isinstance(currency, str) else "немає коду валюти"
+        if error:
+            logging.warning(f"Джерело курсів: пропущено рядок {currency!r}: {error}")
+            continue
+        rows.append((currency.upper(), buy, sell))
+    if not rows:
+        raise ValueError("Джерело не містить жодного коректного курсу")
+    return rows
+
+
+class RateFeed:
+    """Періодично завантажує курси з HTTP(S)-адреси або локального JSON-файлу.
+
+    Для HTTP використовується одна сесія aiohttp на весь час роботи та умовні запити
+    (If-None-Match / If-Modified-Since), тож незмінені дані не завантажуються і не
+    розбираються. Для файлу так само порівнюється час зміни. У базу потрапляють
+    лише курси, що змінились. Після помилки наступна спроба відкладається
+    експоненційно, до max_backoff секунд.
+    """
+
+    def __init__(self, source: str, interval: float = 3600, timeout: float = 10,
+                 retry_delay: float = 30, max_backoff: float = 3600):
+        self.source = source
+        self.interval = interval
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self._session = None
+        self._etag = None
+        self._last_modified = None
+        self._mtime = None
+        self._pending = None  # валідатори нової відповіді, запам'ятовуються лише після успішного застосування
+
+    @property
+    def is_http(self) -> bool:
+        return self.source.startswith(("http://", "https://"))
+
+    async def _fetch_http(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        headers = {}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+        async with self._session.get(self.source, headers=headers) as response:
+            if response.status == 304:
+                return None
+            response.raise_for_status()
+            body = await response.read()
+            self._pending = {
+                "_etag": response.headers.get("ETag"),
+                "_last_modified": response.headers.get("Last-Modified"),
+            }
+            return body
+
+    def _read_file(self):
+        path = self.source.removeprefix("file://")
+        mtime = os.stat(path).st_mtime
+        if mtime == self._mtime:
+            return mtime, None
+        with open(path, "rb") as f:
+            return mtime, f.read()
+
+    async def _fetch_file(self):
+        # Диск читаємо в окремому потоці, щоб не зупиняти цикл подій
+        mtime, body = await asyncio.to_thread(self._read_file)
+        self._pending = {"_mtime": mtime}
+        return body
+
+    async def fetch(self):
+        """Повертає тіло відповіді або None, якщо дані не змінились"""
+        return await (self._fetch_http() if self.is_http else self._fetch_file())
+
+    async def poll_once(self) -> int:
+        """Одна перевірка джерела. Повертає кількість змінених курсів"""
+        body = await self.fetch()
+        if body is None:
+            return 0
+        rows = parse_rates(json.loads(body))
+        _, changes = await async_database.set_rates(rows)
+        # Дані застосовано — тепер їх можна пропускати як незмінені
+        for name, value in self._pending.items():
+            setattr(self, name, value)
+        if changes:
+            logging.info(f"Джерело курсів: оновлено {', '.join(c for c, _, _ in changes)}")
+        return len(changes)
+
+    async def run(self):
+        """Фонова задача: опитує джерело кожні interval секунд"""
+        while True:
+            try:
+                await self.poll_once()
+                self.failures = 0
+                delay = self.interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                delay = min(self.retry_delay * 2 ** (self.failures - 1), self.max_backoff)
+                logging.warning(f"Джерело курсів недоступне ({e}), повтор через {delay:.0f} с")
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+if __name__ == "__main__":
+    # Перевірка джерела без запуску бота: python rate_feed.py http://127.0.0.1:8080/rates.json
+    async def _check(source):
+        feed = RateFeed(source)
+        try:
+            for row in parse_rates(json.loads(await feed.fetch())):
+                print(*row)
+        finally:
+            await feed.close()
+
+    asyncio.run(_check(sys.argv[1]))
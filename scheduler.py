@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from contextlib import nullcontext
+
+from aiogram import BaseMiddleware
+
+from config import UPDATE_CONCURRENCY, UPDATE_QUEUE_LIMIT, UPDATE_USER_QUEUE_LIMIT
+
+
+class UpdateScheduler(BaseMiddleware):
+    """Зовнішній middleware для dp.update: обмежує паралельну обробку оновлень.
+
+    Оновлення одного користувача виконуються строго по черзі (FIFO-замок на user_id),
+    тож швидкі натискання не змагаються за той самий стан FSM. Різні користувачі
+    обробляються паралельно, але не більше `concurrency` одночасно. Понад `max_per_user`
+    незавершених оновлень одного користувача відкидаються одразу, тож один користувач
+    не займає загальну чергу. У `queued` рахуються лише оновлення, що вже дочекалися
+    черги свого користувача і чекають на вільне місце. Якщо їх `max_queue`, нові
+    відкидаються. Поки черга довша за `overload_threshold`, `overloaded` дає сигнал
+    іншим модулям відкласти другорядну роботу (логи, статистику).
+    """
+
+    def __init__(self, concurrency: int = 64, max_queue: int = 1000, overload_threshold: int = None,
+                 max_per_user: int = 5):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.overload_threshold = overload_threshold or concurrency
+        self.queued = 0        # чекають на вільне місце
+        self.active = 0        # обробляються зараз
+        self.shed = 0          # відкинуто через перевантаження
+        self.user_dropped = 0  # відкинуто понад ліміт одного користувача
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._user_locks = {}  # user_id -> [Lock, кількість оновлень користувача в роботі]
+
+    @property
+    def overloaded(self) -> bool:
+        return self.queued >= self.overload_threshold
+
+    def _user_lock(self, user_id):
+        entry = self._user_locks.get(user_id)
+        if entry is None:
+            entry = self._user_locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        return entry
+
+    def _release_user_lock(self, user_id, entry):
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._user_locks[user_id]
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        pending = self._user_locks.get(user.id) if user else None
+        if pending and pending[1] >= self.max_per_user:
+            # Користувач натискає швидше, ніж ми відповідаємо — зайве відкидаємо лише йому
+            self.user_dropped += 1
+            return None
+        if self.queued >= self.max_queue:
+            self.shed += 1
+            if self.shed % 100 == 1:
+                logging.warning(f"Перевантаження: відкинуто оновлень {self.shed}, у черзі {self.queued}")
+            return None
+
+        entry = self._user_lock(user.id) if user else None
+        try:
+            async with entry[0] if entry else nullcontext():
+                self.queued += 1
+                try:
+                    await self._semaphore.acquire()
+                finally:
+                    self.queued -= 1
+                self.active += 1
+                try:
+                    return await handler(event, data)
+                finally:
+                    self.active -= 1
+                    self._semaphore.release()
+        finally:
+            if entry:
+                self._release_user_lock(user.id, entry)
+
+
+update_scheduler = UpdateScheduler(
+    concurrency=UPDATE_CONCURRENCY, max_queue=UPDATE_QUEUE_LIMIT, max_per_user=UPDATE_USER_QUEUE_LIMIT
+)
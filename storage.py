@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+import async_database
+import database
+
+
+class _Record:
+    __slots__ = ("state", "data", "expires_at", "loaded_at")
+
+    def __init__(self, state=None, data=None, expires_at=None, loaded_at=0.0):
+        self.state = state
+        self.data = data if data is not None else {}
+        self.expires_at = expires_at
+        self.loaded_at = loaded_at
+
+    def is_empty(self):
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-сховище в тому ж файлі SQLite, що й курси.
+
+    Записи кешуються в пам'яті (гарячий шар) і вважаються свіжими `hot_ttl` секунд,
+    після чого перечитуються з бази. Зміни скидаються в базу пачкою раз на
+    `flush_interval` секунд. Тож інший процес бачить їх із запізненням до
+    hot_ttl + flush_interval, а пізніший flush перезаписує весь рядок — цей режим
+    розрахований на один процес. З `shared=True` гарячого шару немає: кожне читання
+    йде в базу, а кожна зміна записується одразу, тож стан спільний для кількох
+    процесів (ціною запиту до бази на кожне звернення). Ці запити йдуть через
+    окремий потік async_database.run_fsm з коротким очікуванням блокування; якщо
+    база зайнята, читання повертає останній відомий стан, а запис відкладається
+    до фонового скидання.
+    Кожен ключ має термін дії: `state_ttl` для конкретних станів
+    (напр. сесія адміна), інакше `default_ttl`. Прострочені стани не повертаються
+    і періодично видаляються з бази.
+    """
+
+    def __init__(
+        self,
+        default_ttl: float = 86400,
+        state_ttl: Optional[Dict[str, float]] = None,
+        hot_ttl: float = 5,
+        flush_interval: float = 1,
+        purge_interval: float = 300,
+        key_builder: Optional[KeyBuilder] = None,
+        shared: bool = False,
+    ) -> None:
+        self.default_ttl = default_ttl
+        self.state_ttl = state_ttl or {}
+        self.shared = shared
+        self.hot_ttl = 0 if shared else hot_ttl
+        self._run_db = async_database.run_fsm if shared else async_database.run
+        self.flush_interval = flush_interval
+        self.purge_interval = purge_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._hot: Dict[str, _Record] = {}
+        self._dirty = set()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+    def _ensure_task(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def _ttl_for(self, state: Optional[str]) -> float:
+        return self.state_ttl.get(state, self.default_ttl)
+
+    async def _record(self, key: StorageKey) -> _Record:
+        k = self.key_builder.build(key)
+        now = time.time()
+        record = self._hot.get(k)
+        if record is None or (k not in self._dirty and now - record.loaded_at >= self.hot_ttl):
+            try:
+                row = await self._run_db(database.fsm_load, k)
+            except sqlite3.OperationalError as e:
+                if record is None:
+                    raise
+                # База зайнята — краще останній відомий стан, ніж зупинка оновлення
+                logging.warning(f"FSM: не вдалося прочитати стан, використовуємо кеш: {e}")
+            else:
+                if row is None:
+                    record = _Record(loaded_at=now)
+                else:
+                    state, data, expires_at = row
+                    record = _Record(state, json.loads(data) if data else {}, expires_at, now)
+                self._hot[k] = record
+        if record.expires_at is not None and record.expires_at < now:
+            # Термін дії минув — забуваємо стан і дані
+            record.state, record.data, record.expires_at = None, {}, None
+            await self._changed(k)
+        return record
+
+    async def _changed(self, k: str):
+        self._ensure_task()
+        if self.shared:
+            try:
+                await self._save({k})
+                return
+            except sqlite3.OperationalError as e:
+                logging.warning(f"FSM: базу заблоковано, запис стану відкладено: {e}")
+        self._dirty.add(k)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        if record.is_empty():
+            record.expires_at = None
+        else:
+            record.expires_at = time.time() + self._ttl_for(record.state)
+        await self._changed(self.key_builder.build(key))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._record(key)
+        record.data = data.copy()
+        if record.is_empty():
+            record.expires_at = None
+        elif record.state is None or record.expires_at is None:
+            # Дані без стану (напр. обрана валюта) живуть default_ttl від останньої зміни
+            record.expires_at = time.time() + self._ttl_for(record.state)
+        await self._changed(self.key_builder.build(key))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._record(key)).data.copy()
+
+    async def _save(self, keys):
+        upserts, deletes = [], []
+        for k in keys:
+            record = self._hot.get(k)
+            if record is None or record.is_empty():
+                deletes.append(k)
+            else:
+                upserts.append((k, record.state, json.dumps(record.data), record.expires_at))
+        await self._run_db(database.fsm_save, upserts, deletes)
+
+    async def flush(self):
+        """Записує всі змінені ключі в базу однією транзакцією"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            keys, self._dirty = self._dirty, set()
+            try:
+                await self._save(keys)
+            except Exception as e:
+                logging.error(f"FSM storage flush error: {e}")
+                self._dirty |= keys
+
+    def _evict_hot(self):
+        # Чисті записи все одно будуть перечитані після hot_ttl, тож тримати їх немає сенсу.
+        # У спільному режимі вони лишаються довше як запасний варіант, коли база зайнята
+        now = time.time()
+        keep = self.purge_interval if self.shared else self.hot_ttl
+        stale = [k for k, r in self._hot.items() if k not in self._dirty and now - r.loaded_at >= keep]
+        for k in stale:
+            del self._hot[k]
+
+    async def _run(self):
+        last_purge = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            self._evict_hot()
+            if time.monotonic() - last_purge >= self.purge_interval:
+                last_purge = time.monotonic()
+                try:
+                    purged = await async_database.run(database.fsm_purge_expired, time.time())
+                    if purged:
+                        logging.info(f"FSM: видалено прострочених станів: {purged}")
+                except Exception as e:
+                    logging.error(f"FSM storage purge error: {e}")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()